@@ -0,0 +1,234 @@
+import argparse
+import hashlib
+import io
+import math
+import os
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import contextily as ctx
+import numpy as np
+import pyogrio
+from PIL import Image
+from pyproj import CRS, Transformer
+
+from data_store import GEOJSON_NAME, SNAPSHOT_DIR, source_path
+from tile_math import tile_xy
+
+BASEMAP_DIR = SNAPSHOT_DIR / 'basemap'
+# Tile source; BASEMAP_TILE_URL can point the cache at a mirror, such as `basemap_cache.py serve` on another node
+TILE_URL = os.environ.get('BASEMAP_TILE_URL', ctx.providers.OpenStreetMap.Mapnik.build_url())
+ATTRIBUTION = ctx.providers.OpenStreetMap.Mapnik.attribution
+# Least recently used tiles are evicted once a cache directory grows past this size
+CACHE_LIMIT_MB = 1024
+PREFETCH_ZOOMS = range(8, 13)
+# Fraction of the county's width and height added on each side, covering the margins matplotlib puts around a plot
+PREFETCH_MARGIN = 0.1
+# Tile servers such as OpenStreetMap ask bulk clients to keep to a couple of connections
+FETCH_WORKERS = 2
+USER_AGENT = 'dissertation_2024-basemap-cache'
+# Half the circumference of the web mercator (EPSG:3857) world, in meters
+MERCATOR_HALF = math.pi * 6378137
+
+
+def cache_dir(url=TILE_URL, directory=BASEMAP_DIR):
+    # One subdirectory per tile source, so switching sources never mixes their tiles
+    return directory / hashlib.sha256(url.encode()).hexdigest()[:12]
+
+
+def offline_mode():
+    # BASEMAP_OFFLINE=1, true or yes turns fetching off; unset, 0 or false leave it on
+    return os.environ.get('BASEMAP_OFFLINE', '').strip().lower() in ('1', 'true', 'yes')
+
+
+def tile_path(cache, zoom, x, y):
+    return cache / str(zoom) / str(x) / f'{y}.png'
+
+
+def auto_zoom(west, south, east, north):
+    # Same choice as contextily's zoom='auto' for a lon/lat box
+    return int(min(np.ceil(np.log2(720 / (east - west))), np.ceil(np.log2(720 / (north - south)))))
+
+
+def tile_range(bounds, zoom):
+    """Tiles (zoom, x, y) covering lon/lat `bounds`, row by row."""
+    x0, y0 = tile_xy(bounds[0], bounds[3], zoom)
+    x1, y1 = tile_xy(bounds[2], bounds[1], zoom)
+    return [(zoom, x, y) for y in range(y0, y1 + 1) for x in range(x0, x1 + 1)]
+
+
+def fetch_tile(url, zoom, x, y, timeout=30):
+    request = urllib.request.Request(url.format(z=zoom, x=x, y=y), headers={'User-Agent': USER_AGENT})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.read()
+
+
+def store_tile(cache, zoom, x, y, data):
+    path = tile_path(cache, zoom, x, y)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    partial_path.write_bytes(data)
+    partial_path.replace(path)
+    return path
+
+
+def read_tile(cache, zoom, x, y, url=TILE_URL, offline=False):
+    """PNG bytes of one tile from the cache, fetched and stored first unless `offline`.
+
+    Reading a tile refreshes its modification time, which is what the LRU
+    eviction in enforce_limit orders by. Raises FileNotFoundError for a
+    tile that is neither cached nor fetchable.
+    """
+    path = tile_path(cache, zoom, x, y)
+    if path.exists():
+        os.utime(path)
+        return path.read_bytes()
+    if offline:
+        raise FileNotFoundError(f'tile {zoom}/{x}/{y} is not cached in {cache}')
+    try:
+        data = fetch_tile(url, zoom, x, y)
+    except (urllib.error.URLError, OSError) as error:
+        raise FileNotFoundError(f'tile {zoom}/{x}/{y} is not cached in {cache} and could not be fetched: {error}')
+    store_tile(cache, zoom, x, y, data)
+    return data
+
+
+def enforce_limit(cache, limit_mb=CACHE_LIMIT_MB):
+    """Delete the least recently used tiles until the cache fits in `limit_mb`. Returns the number deleted."""
+    tiles = []
+    for path in cache.glob('*/*/*.png'):
+        stat = path.stat()
+        tiles.append((stat.st_mtime, stat.st_size, path))
+    excess = sum(size for _, size, _ in tiles) - limit_mb * 2 ** 20
+    deleted = 0
+    for _, size, path in sorted(tiles):
+        if excess <= 0:
+            break
+        path.unlink(missing_ok=True)
+        excess -= size
+        deleted += 1
+    return deleted
+
+
+def county_bounds(margin=PREFETCH_MARGIN):
+    # Lon/lat bounding box of LA County plus a margin, read from the GeoJSON header without loading the polygons
+    west, south, east, north = pyogrio.read_info(source_path(GEOJSON_NAME))['total_bounds']
+    dx, dy = (east - west) * margin, (north - south) * margin
+    return west - dx, south - dy, east + dx, north + dy
+
+
+def prefetch(bounds=None, zooms=PREFETCH_ZOOMS, url=TILE_URL, directory=BASEMAP_DIR, limit_mb=CACHE_LIMIT_MB,
+             workers=FETCH_WORKERS):
+    """Download every missing tile covering `bounds` (lon/lat, LA County by default) at `zooms` into the cache.
+
+    Returns counts of the tiles already cached, fetched and failed, and of
+    the tiles evicted afterwards to stay within `limit_mb`.
+    """
+    cache = cache_dir(url, directory)
+    tiles = [tile for zoom in zooms for tile in tile_range(bounds or county_bounds(), zoom)]
+    missing = [tile for tile in tiles if not tile_path(cache, *tile).exists()]
+
+    def fetch(tile):
+        try:
+            store_tile(cache, *tile, fetch_tile(url, *tile))
+            return True
+        except (urllib.error.URLError, OSError):
+            return False
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        fetched = sum(pool.map(fetch, missing))
+    return {'cached': len(tiles) - len(missing), 'fetched': fetched, 'failed': len(missing) - fetched,
+            'evicted': enforce_limit(cache, limit_mb)}
+
+
+def mercator_extent(zoom, x0, y0, x1, y1):
+    # (left, right, bottom, top) of a block of tiles in EPSG:3857 meters
+    size = 2 * MERCATOR_HALF / 2 ** zoom
+    return (-MERCATOR_HALF + x0 * size, -MERCATOR_HALF + (x1 + 1) * size,
+            MERCATOR_HALF - (y1 + 1) * size, MERCATOR_HALF - y0 * size)
+
+
+def stitch_tiles(bounds, zoom, url=TILE_URL, directory=BASEMAP_DIR, offline=False):
+    """RGBA image of the cached tiles covering lon/lat `bounds`, with its EPSG:3857 extent."""
+    cache = cache_dir(url, directory)
+    tiles = tile_range(bounds, zoom)
+    xs, ys = [x for _, x, _ in tiles], [y for _, _, y in tiles]
+    image = None
+    for _, x, y in tiles:
+        tile = np.asarray(Image.open(io.BytesIO(read_tile(cache, zoom, x, y, url, offline))).convert('RGBA'))
+        if image is None:
+            size = tile.shape[0]
+            image = np.zeros(((max(ys) - min(ys) + 1) * size, (max(xs) - min(xs) + 1) * size, 4), dtype=np.uint8)
+        row, col = (y - min(ys)) * size, (x - min(xs)) * size
+        image[row:row + size, col:col + size] = tile
+    return image, mercator_extent(zoom, min(xs), min(ys), max(xs), max(ys))
+
+
+def add_cached_basemap(ax, crs, zoom='auto', url=TILE_URL, directory=BASEMAP_DIR, offline=None,
+                       limit_mb=CACHE_LIMIT_MB, attribution=ATTRIBUTION, **imshow_args):
+    """ctx.add_basemap drawn from the local tile cache.
+
+    The tiles under the current axis extent (in `crs`) are stitched from the
+    cache, warped to `crs` and drawn below the data without changing the
+    extent. Missing tiles are fetched into the cache, unless `offline` (by
+    default when the BASEMAP_OFFLINE environment variable is 1, true or
+    yes), in which case they raise FileNotFoundError; run
+    `python code/basemap_cache.py prefetch` on a connected machine first.
+    """
+    offline = offline_mode() if offline is None else offline
+    xmin, xmax, ymin, ymax = ax.axis()
+    bounds = Transformer.from_crs(crs, 'EPSG:4326', always_xy=True).transform_bounds(xmin, ymin, xmax, ymax)
+    zoom = auto_zoom(*bounds) if zoom == 'auto' else zoom
+    image, extent = stitch_tiles(bounds, zoom, url, directory, offline)
+    if not offline:
+        enforce_limit(cache_dir(url, directory), limit_mb)
+    if CRS.from_user_input(crs) != CRS.from_epsg(3857):
+        image, extent = ctx.warp_tiles(image, extent, t_crs=crs)
+    ax.imshow(image, extent=extent, interpolation='bilinear', aspect=ax.get_aspect(), **imshow_args)
+    ax.axis((xmin, xmax, ymin, ymax))
+    if attribution:
+        ctx.add_attribution(ax, attribution)
+
+
+def tile_server(directory, port=8000):
+    # HTTP server of a z/x/y tile directory, not yet serving; port 0 picks a free port
+    return ThreadingHTTPServer(('', port), partial(SimpleHTTPRequestHandler, directory=str(directory)))
+
+
+def serve(directory, port=8000):
+    """Serve a cache directory over HTTP as {z}/{x}/{y}.png tiles.
+
+    Air-gapped render nodes can prefetch from this mirror by setting
+    BASEMAP_TILE_URL=http://<host>:<port>/{z}/{x}/{y}.png; it also stands in
+    for the live tile server when trying the cache without network access.
+    """
+    server = tile_server(directory, port)
+    print(f'Serving {directory} on http://localhost:{server.server_port}/{{z}}/{{x}}/{{y}}.png')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Offline basemap tile cache.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    fetch_parser = commands.add_parser('prefetch', help='download the tiles of a bounding box into the cache')
+    fetch_parser.add_argument('--zooms', type=int, nargs=2, default=[min(PREFETCH_ZOOMS), max(PREFETCH_ZOOMS)],
+                              metavar=('MIN', 'MAX'), help='zoom range to download')
+    fetch_parser.add_argument('--bounds', type=float, nargs=4, default=None, metavar=('W', 'S', 'E', 'N'),
+                              help='lon/lat bounding box (default: LA County)')
+    fetch_parser.add_argument('--url', default=TILE_URL, help='tile URL template with {z}, {x} and {y}')
+    fetch_parser.add_argument('--limit-mb', type=float, default=CACHE_LIMIT_MB, help='cache size limit')
+    fetch_parser.add_argument('-j', '--jobs', type=int, default=FETCH_WORKERS, help='concurrent downloads')
+    serve_parser = commands.add_parser('serve', help='serve a tile cache to other machines')
+    serve_parser.add_argument('--url', default=TILE_URL, help='tile source whose cache to serve')
+    serve_parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+
+    if args.command == 'prefetch':
+        counts = prefetch(args.bounds, range(args.zooms[0], args.zooms[1] + 1), args.url, limit_mb=args.limit_mb,
+                          workers=args.jobs)
+        print(', '.join(f'{count} {name}' for name, count in counts.items()) + f' tiles in {cache_dir(args.url)}')
+    else:
+        serve(cache_dir(args.url), args.port)
@@ -0,0 +1,213 @@
+import argparse
+import io
+import json
+import math
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyogrio
+import shapely
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from data_store import SNAPSHOT_DIR, load_neighborhoods
+from effect_model import EDGE_ATTRIBUTES, simulate_effects
+from instrument import peak_rss_mb, reset_peak_rss
+from exposure_rules import ANALYSIS_COLUMNS, EXPOSURE_RULES, evaluate_rules
+from overlay import aggregate_pieces, build_overlay
+from road_network import build_road_network, edge_chains
+from road_render import draw_edges
+from roadway_reader import ROADWAY_PATH, read_roadways
+
+BENCHMARK_DIR = SNAPSHOT_DIR / 'benchmark'
+SCALES = [1, 10, 100, 1000]
+
+
+def tile_geometry(geometry, bounds, scale):
+    # `scale` copies of the geometry, each shrunk to one cell of a grid laid over `bounds`
+    side = math.ceil(math.sqrt(scale))
+    width, height = bounds[2] - bounds[0], bounds[3] - bounds[1]
+    origin = np.array(bounds[:2])
+    copies = []
+    for tile in range(scale):
+        offset = origin + np.array([tile % side * width, tile // side * height]) / side
+        copies.append(shapely.transform(geometry, lambda xy: (xy - origin) / side + offset))
+    return np.concatenate(copies)
+
+
+def synthetic_dataset(gdf, roadways, scale, seed=0):
+    """Neighborhoods and roads repeated `scale` times over the extent of the real data.
+
+    Every copy is the real layer shrunk into one cell of a grid, so segment and
+    polygon counts grow by `scale` while the extent and the roads-per-polygon
+    ratio stay those of Los Angeles. Numeric neighborhood values get a small
+    multiplicative noise so the copies are not identical.
+    """
+    bounds = gdf.total_bounds
+    rng = np.random.default_rng(seed)
+    neighborhoods = pd.concat([gdf.drop(columns='geometry')] * scale, ignore_index=True)
+    copy = np.repeat(np.arange(scale), len(gdf)).astype(str)
+    for column in ['name', 'slug']:
+        neighborhoods[column] = neighborhoods[column].astype(str) + '-' + copy
+    numeric = neighborhoods.select_dtypes('number').columns
+    neighborhoods[numeric] = neighborhoods[numeric] * rng.normal(1, 0.05, size=(len(neighborhoods), len(numeric)))
+    neighborhoods = gpd.GeoDataFrame(neighborhoods, geometry=tile_geometry(gdf.geometry.values, bounds, scale),
+                                     crs=gdf.crs)
+    roads = gpd.GeoDataFrame(geometry=tile_geometry(roadways.geometry.values, bounds, scale), crs=roadways.crs)
+    return neighborhoods, roads
+
+
+def dataset_paths(scale):
+    directory = BENCHMARK_DIR / f'scale-{scale}'
+    return directory / 'neighborhoods.feather', directory / 'roads.fgb'
+
+
+def prepare_dataset(scale):
+    """Paths of the neighborhoods and roads of a scale, generating the synthetic files once."""
+    if scale == 1:
+        return None, ROADWAY_PATH
+    neighborhoods_path, roads_path = dataset_paths(scale)
+    if not roads_path.exists():
+        gdf = load_neighborhoods()
+        neighborhoods, roads = synthetic_dataset(gdf, read_roadways(crs=gdf.crs), scale)
+        neighborhoods_path.parent.mkdir(parents=True, exist_ok=True)
+        neighborhoods.to_feather(neighborhoods_path, compression='uncompressed')
+        partial = roads_path.with_name('partial-' + roads_path.name)
+        pyogrio.write_dataframe(roads, partial, driver='FlatGeobuf')
+        partial.replace(roads_path)
+    return neighborhoods_path, roads_path
+
+
+def stage_load(state, neighborhoods_path, roads_path):
+    if neighborhoods_path is None:
+        state['gdf'] = load_neighborhoods()
+    else:
+        state['gdf'] = gpd.read_feather(neighborhoods_path, memory_map=True)
+    state['roadways'] = read_roadways(roads_path, crs=state['gdf'].crs)
+
+
+def stage_network(state):
+    state['network'] = build_road_network(state['roadways'])
+
+
+def stage_join(state):
+    state['overlay'] = build_overlay(state['network'], state['gdf'])
+
+
+def stage_simulate(state):
+    # As simulation.simulate_changes: the effect model runs once per chain piece, carried back to every edge
+    covered, piece, attributes = aggregate_pieces(state['overlay'], state['gdf'], edge_chains(state['network']))
+    result = simulate_effects(*[attributes[column] for column in EDGE_ATTRIBUTES])
+    state['covered'], state['pieces'] = covered, len(result['color_class'])
+    state['result'] = {column: values[piece] for column, values in result.items()}
+
+
+def stage_correlation(state):
+    # The high/low exposure statistics of comparative_analysis.py, with the masks evaluated afresh
+    exposure = evaluate_rules(state['gdf'], EXPOSURE_RULES, cache=False)
+    subsets = [state['gdf'].loc[mask, ANALYSIS_COLUMNS] for mask in exposure.values()]
+    state['statistics'] = [subset.describe() for subset in subsets]
+    state['correlation'] = [subset.corr() for subset in subsets]
+
+
+def stage_render(state):
+    fig, ax = plt.subplots(figsize=(10, 10))
+    state['gdf'].plot(ax=ax, color='lightgrey', edgecolor='black', linewidth=0.1)
+    draw_edges(ax, state['network'].edge_coords[state['covered']], state['result']['color_class'], linewidth=0.5)
+    fig.savefig(io.BytesIO(), dpi=100, format='png')
+    plt.close(fig)
+
+
+# Pipeline stages in run order
+STAGES = {'load': stage_load, 'network': stage_network, 'join': stage_join, 'simulate': stage_simulate,
+          'correlation': stage_correlation, 'render': stage_render}
+
+
+def run_pipeline(neighborhoods_path, roads_path, trace_memory=False):
+    # Seconds, peak RSS MB and (when tracing) traced peak MB above the memory held before the stage, of every stage
+    state, timings = {}, {}
+    for stage, function in STAGES.items():
+        args = (neighborhoods_path, roads_path) if stage == 'load' else ()
+        if trace_memory:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        reset_peak_rss()
+        start = time.perf_counter()
+        function(state, *args)
+        seconds = time.perf_counter() - start
+        rss = peak_rss_mb()
+        peak = (tracemalloc.get_traced_memory()[1] - before) / 2 ** 20 if trace_memory else None
+        timings[stage] = (seconds, rss, peak)
+    sizes = {'polygons': len(state['gdf']), 'road_lines': len(state['roadways']),
+             'edges': state['network'].n_edges, 'covered_edges': len(state['covered']), 'pieces': state['pieces']}
+    return timings, sizes
+
+
+def benchmark(scales=SCALES, repeat=1, memory=True):
+    """Time every pipeline stage at each scale, with its peak RSS and the peak traced memory of a separate run.
+
+    Timings are the best of `repeat` untraced runs, so tracing does not slow
+    them. `peak_rss_mb` is the highest resident set size of the process
+    during the stage in the first of those runs, which includes the GEOS,
+    GDAL and Arrow buffers tracemalloc cannot see; where the peak cannot be
+    reset per stage (outside Linux) it is the process peak up to the end of
+    the stage. `peak_mb` is how far the memory traced by tracemalloc (Python
+    and NumPy allocations) rose above its level at the start of the stage.
+    Returns one row per (scale, stage).
+    """
+    rows = []
+    for scale in scales:
+        paths = prepare_dataset(scale)
+        runs = [run_pipeline(*paths) for _ in range(repeat)]
+        sizes = runs[0][1]
+        peaks = {}
+        if memory:
+            tracemalloc.start()
+            traced, _ = run_pipeline(*paths, trace_memory=True)
+            tracemalloc.stop()
+            peaks = {stage: peak for stage, (_, _, peak) in traced.items()}
+        for stage in STAGES:
+            rows.append({'scale': scale, 'stage': stage, **sizes,
+                         'seconds': min(timings[stage][0] for timings, _ in runs),
+                         'peak_rss_mb': runs[0][0][stage][1], 'peak_mb': peaks.get(stage)})
+    return rows
+
+
+def environment():
+    # Commit and software versions the results belong to
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=SNAPSHOT_DIR.parent.parent).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'commit': commit, 'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(), 'machine': platform.machine(), 'numpy': np.__version__,
+            'pandas': pd.__version__, 'geopandas': gpd.__version__, 'shapely': shapely.__version__}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time and measure the memory of every pipeline stage.')
+    parser.add_argument('--scales', type=int, nargs='+', default=SCALES,
+                        help='dataset sizes as multiples of the LA data (1 is the real data)')
+    parser.add_argument('--repeat', type=int, default=1, help='timed runs per scale, the best one is kept')
+    parser.add_argument('--no-memory', action='store_true', help='skip the traced memory run')
+    parser.add_argument('--output', default=None, help='JSON results file (default: data/snapshots/benchmark/<commit>.json)')
+    args = parser.parse_args()
+
+    rows = benchmark(args.scales, repeat=args.repeat, memory=not args.no_memory)
+    results = {'environment': environment(), 'results': rows}
+    output = args.output or BENCHMARK_DIR / f'{results["environment"]["commit"] or "results"}.json'
+    BENCHMARK_DIR.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=2)
+
+    print(pd.DataFrame(rows).set_index(['scale', 'stage'])[['edges', 'polygons', 'seconds', 'peak_rss_mb', 'peak_mb']].round(3))
+    print(f'results written to {output}', file=sys.stderr)
@@ -0,0 +1,175 @@
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from data_store import SNAPSHOT_DIR
+from indicators import INDICATOR_FILES
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+CODE_DIR = REPO_ROOT / 'code'
+STATE_PATH = SNAPSHOT_DIR / 'figure_build.json'
+
+GEOJSON = 'data/los-angeles-county.geojson'
+MERGED = 'data/merged_data.csv'
+CONVERTED = 'data/merged_data_converted.csv'
+ROADWAY = ['data/roadway/los-angeles-county-freeways.' + ext for ext in ['shp', 'shx', 'dbf', 'prj']]
+
+# Inputs and outputs of every script, relative to the repository root
+TARGETS = {
+    'convert.py': {
+        'inputs': [GEOJSON] + ['data/' + name for name in INDICATOR_FILES.values()],
+        'outputs': [CONVERTED],
+    },
+    'pm2.5.py': {'inputs': [GEOJSON, MERGED], 'outputs': ['figure/pm2.5_vehicle.png']},
+    'socio_econo.py': {'inputs': [GEOJSON, MERGED], 'outputs': ['figure/socio_ethnic.png']},
+    'commute_mode.py': {'inputs': [GEOJSON, CONVERTED], 'outputs': ['figure/commute_mode_maps_legend.png']},
+    'comparative_analysis.py': {
+        'inputs': [GEOJSON, CONVERTED],
+        'outputs': ['figure/high_exposure_correlation.png', 'figure/low_exposure_correlation.png',
+                    'table/high_exposure_stats.csv', 'table/low_exposure_stats.csv',
+                    'table/exposure_correlation_ci.csv'],
+    },
+    'correlation_comparative.py': {'inputs': [GEOJSON, CONVERTED] + ROADWAY,
+                                   'outputs': ['figure/comparative_analysis.png']},
+    'simulation.py': {'inputs': [GEOJSON, CONVERTED] + ROADWAY,
+                      'outputs': ['figure/visualize_fact.png', 'figure/simulation_area.png']},
+    'commute_simulation.py': {'inputs': [GEOJSON, CONVERTED] + ROADWAY,
+                              'outputs': ['figure/simulation_area_singlery.png']},
+    'roadway.py': {'inputs': [GEOJSON] + ROADWAY, 'outputs': ['figure/roadway.png']},
+}
+
+# convert.py rewrites the converted dataset, so it only runs when asked for
+DEFAULT_TARGETS = [name for name in TARGETS if name != 'convert.py']
+
+
+def local_modules(script):
+    """The script and every module of code/ it imports, directly or indirectly."""
+    seen, pending = [], [CODE_DIR / script]
+    while pending:
+        path = pending.pop()
+        if path in seen or not path.exists():
+            continue
+        seen.append(path)
+        for node in ast.walk(ast.parse(path.read_bytes())):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            pending += [CODE_DIR / (name.split('.')[0] + '.py') for name in names]
+    return sorted(seen)
+
+
+def target_key(script, parameters):
+    # Hash of the input files, the code that produces the target and the build parameters
+    digest = hashlib.sha256(json.dumps(parameters, sort_keys=True).encode())
+    for path in [REPO_ROOT / name for name in TARGETS[script]['inputs']] + local_modules(script):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes() if path.exists() else b'')
+    return digest.hexdigest()
+
+
+def upstream(script, selected):
+    # Selected targets producing one of the script's inputs
+    inputs = set(TARGETS[script]['inputs'])
+    return [other for other in selected if other != script and inputs & set(TARGETS[other]['outputs'])]
+
+
+def available_cpus():
+    return len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+
+
+def run_target(script, log_dir):
+    env = dict(os.environ, MPLBACKEND='Agg')
+    log_path = log_dir / f'{script}.log'
+    with open(log_path, 'w') as log:
+        result = subprocess.run([sys.executable, str(CODE_DIR / script)], cwd=REPO_ROOT, env=env,
+                                stdout=log, stderr=subprocess.STDOUT)
+    return result.returncode, log_path
+
+
+def build(targets=DEFAULT_TARGETS, jobs=None, force=False, parameters=None):
+    """Render the selected targets headlessly, skipping those that are up to date.
+
+    Independent targets run in parallel worker processes on the Agg backend; a
+    target waits for any selected target producing one of its inputs. A target
+    is up to date when all its outputs exist and the hash of its inputs, code
+    and `parameters` matches the last successful build. Returns a dict of
+    target -> 'built', 'skipped', 'failed' or 'blocked'. Targets listed twice
+    are built once.
+    """
+    targets = list(dict.fromkeys(targets))
+    parameters = parameters or {}
+    state = json.loads(STATE_PATH.read_text()) if STATE_PATH.exists() else {}
+    log_dir = SNAPSHOT_DIR / 'figure_logs'
+    log_dir.mkdir(parents=True, exist_ok=True)
+    for directory in ['figure', 'table']:
+        (REPO_ROOT / directory).mkdir(exist_ok=True)
+
+    status, running = {}, {}
+    # Every target renders large high-dpi figures, so more jobs than CPUs only adds memory pressure
+    with ThreadPoolExecutor(max_workers=jobs or available_cpus()) as pool:
+        while len(status) < len(targets):
+            settled = len(status)
+            for script in targets:
+                if script in status or script in running:
+                    continue
+                deps = upstream(script, targets)
+                if any(status.get(dep) in ('failed', 'blocked') for dep in deps):
+                    status[script] = 'blocked'
+                    continue
+                if any(dep not in status for dep in deps):
+                    continue
+                key = target_key(script, parameters)
+                outputs_exist = all((REPO_ROOT / name).exists() for name in TARGETS[script]['outputs'])
+                if not force and outputs_exist and state.get(script) == key:
+                    status[script] = 'skipped'
+                    continue
+                running[script] = (pool.submit(run_target, script, log_dir), key)
+
+            if not running:
+                if len(status) == settled:
+                    # Nothing running and nothing schedulable: the remaining targets wait on each other
+                    status.update({script: 'blocked' for script in targets if script not in status})
+                continue
+            done, _ = wait([future for future, _ in running.values()], return_when=FIRST_COMPLETED)
+            for script, (future, key) in list(running.items()):
+                if future not in done:
+                    continue
+                del running[script]
+                returncode, log_path = future.result()
+                if returncode == 0:
+                    status[script] = 'built'
+                    state[script] = key
+                else:
+                    status[script] = 'failed'
+                    state.pop(script, None)
+                    print(f'{script} failed with exit status {returncode}, see {log_path}', file=sys.stderr)
+                STATE_PATH.write_text(json.dumps(state, indent=2))
+    return status
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the figure set headlessly.')
+    parser.add_argument('targets', nargs='*', help='scripts to build (default: all figure scripts)')
+    parser.add_argument('--all', action='store_true', help='also rebuild the converted dataset')
+    parser.add_argument('--force', action='store_true', help='rebuild even if up to date')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='number of parallel scripts (default: available CPUs)')
+    args = parser.parse_args()
+
+    selected = args.targets or (list(TARGETS) if args.all else DEFAULT_TARGETS)
+    unknown = [name for name in selected if name not in TARGETS]
+    if unknown:
+        parser.error(f'unknown targets: {", ".join(unknown)}')
+
+    status = build(selected, jobs=args.jobs, force=args.force)
+    for script in selected:
+        print(f'{status[script]:>8}  {script}')
+    sys.exit(1 if any(value in ('failed', 'blocked') for value in status.values()) else 0)
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import matplotlib.colors as mcolors
+from matplotlib.collections import PathCollection
+from matplotlib.patches import Patch
+from matplotlib.path import Path
+
+# Color ramp shared by the neighborhood maps, low to high
+COLORS = ['#ffffb2', '#fecc5c', '#fd8d3c', '#F03B20', '#BD0026']
+MISSING_COLOR = 'grey'
+EDGE_COLOR = '0.8'
+LINEWIDTH = 0.8
+
+
+def polygon_path(polygon):
+    # One compound path per (multi)polygon, holes included, like GeoDataFrame.plot
+    parts = [polygon] if polygon.geom_type == 'Polygon' else polygon.geoms
+    rings = [ring for part in parts for ring in [part.exterior, *part.interiors]]
+    return Path.make_compound_path(*[Path(np.asarray(ring.coords)[:, :2], closed=True) for ring in rings])
+
+
+def prepare_polygons(gdf):
+    """Matplotlib paths of the neighborhood polygons, built once and shared by every panel.
+
+    Geometries are normalized so rings wind the way matplotlib expects for
+    holes. Also holds the axis aspect GeoDataFrame.plot would use.
+    """
+    geometries = gdf.geometry.normalize()
+    paths = [None if geometry is None or geometry.is_empty else polygon_path(geometry) for geometry in geometries]
+    aspect = 'equal'
+    if gdf.crs is not None and gdf.crs.is_geographic:
+        bounds = gdf.total_bounds
+        aspect = 1 / np.cos(np.radians((bounds[1] + bounds[3]) / 2))
+    return {'paths': paths, 'aspect': aspect}
+
+
+def panel_colors(values, panel):
+    """RGBA face color of every neighborhood and the legend colors of a panel's classes.
+
+    By default values are classified with a BoundaryNorm over the breaks, as
+    GeoDataFrame.plot(norm=...) does. With 'cut' the bins are right-closed
+    pd.cut intervals and values outside them count as missing. Missing
+    values get the panel's 'missing' color, or are left undrawn when it is
+    None. Also returns the missing mask and the drawing layer of every
+    neighborhood, following GeoDataFrame.plot: the values and then the
+    missing ones, or for 'cut' panels one layer per class.
+    """
+    values = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=float)
+    colors = panel.get('colors', COLORS)
+    cmap = mcolors.ListedColormap(colors)
+    if panel.get('cut'):
+        codes = pd.cut(values, bins=panel['breaks']).codes
+        missing = codes < 0
+        faces = cmap(np.maximum(codes, 0))
+        legend = [cmap(code) for code in range(len(colors))]
+        layer = np.where(missing, len(colors), codes)
+    else:
+        norm = mcolors.BoundaryNorm(panel['breaks'], cmap.N)
+        missing = np.isnan(values)
+        faces = cmap(norm(np.nan_to_num(values)))
+        legend = [cmap(norm(value)) for value in panel['breaks'][:-1]]
+        layer = missing.astype(int)
+    if panel.get('missing', MISSING_COLOR) is not None:
+        faces[missing] = mcolors.to_rgba(panel.get('missing', MISSING_COLOR))
+    return faces, legend, missing, layer
+
+
+def draw_panel(ax, prepared, values, panel):
+    """Draw one choropleth panel from the prepared paths, with its title and legend.
+
+    A panel is a dict with the 'column', 'breaks', 'title' and 'legend_title',
+    and optionally 'labels' (default: the break ranges), 'colors', 'cut' and
+    'missing' (see panel_colors). Only the colors differ between panels;
+    the paths are the same objects in every collection.
+    """
+    faces, legend, missing, layer = panel_colors(values, panel)
+    drawn = np.array([path is not None for path in prepared['paths']])
+    if panel.get('missing', MISSING_COLOR) is None:
+        # Like GeoDataFrame.plot without missing_kwds, missing neighborhoods are left out entirely
+        drawn &= ~missing
+    order = np.flatnonzero(drawn)[np.argsort(layer[drawn], kind='stable')]
+    collection = PathCollection([prepared['paths'][i] for i in order], facecolors=faces[order],
+                                edgecolors=EDGE_COLOR, linewidths=LINEWIDTH)
+    ax.add_collection(collection, autolim=True)
+    ax.autoscale_view()
+    ax.set_aspect(prepared['aspect'])
+
+    breaks = panel['breaks']
+    labels = panel.get('labels') or [f'{breaks[i]}-{breaks[i + 1]}' for i in range(len(breaks) - 1)] + ['Missing']
+    patches = [Patch(color=color, label=label) for color, label in zip(legend + [MISSING_COLOR], labels)]
+    ax.legend(handles=patches, title=panel['legend_title'], loc='lower left')
+    ax.set_title(panel['title'], fontsize=20)
+    ax.axis('off')
+    return collection
+
+
+def draw_choropleths(gdf, panels, axes):
+    """Draw every panel spec on the matching axes from one set of prepared polygon paths.
+
+    Axes left over after the last panel are removed from the figure.
+    """
+    prepared = prepare_polygons(gdf)
+    axes = list(np.ravel(axes))
+    collections = [draw_panel(ax, prepared, gdf[panel['column']], panel) for ax, panel in zip(axes, panels)]
+    for ax in axes[len(panels):]:
+        ax.figure.delaxes(ax)
+    return collections
@@ -1,19 +1,13 @@
-import geopandas as gpd
-import pandas as pd
 import matplotlib.pyplot as plt
-import matplotlib.colors as mcolors
-from matplotlib.patches import Patch
+from choropleth import draw_choropleths
+from data_store import load_neighborhoods
+from geometry_lod import plotting_frame
 
-# Load the data
-geojson_url = 'https://raw.githubusercontent.com/XuZiHan-010/dissertation_2024/main/data/los-angeles-county.geojson'
-merged_data_url = 'https://raw.githubusercontent.com/XuZiHan-010/dissertation_2024/main/data/merged_data_converted.csv'
+# Load the neighborhoods merged with the converted data
+merged_gdf = load_neighborhoods()
 
-# Load the data
-gdf = gpd.read_file(geojson_url)
-df = pd.read_csv(merged_data_url)
-
-# Merge the GeoDataFrame with the CSV data on the appropriate key
-merged_gdf = gdf.merge(df, left_on='name', right_on='name', how='left')
+# Draw the cheapest level of detail that stays within one pixel of a 10-inch panel at 800 dpi
+merged_gdf = plotting_frame(merged_gdf, width_inches=10, dpi=800)
 
 # Columns to plot
 columns_to_plot = ['Public Transit', 'Works from Home', 'Bikes or Walks', 'Drives Alone', 'Carpools']
@@ -27,34 +21,14 @@ boundary_norms = {
     'Carpools': [0, 0.06, 0.09, 0.12, 0.15, 0.18]
 }
 
-# Define the custom color map
-colors = ['#ffffb2', '#fecc5c', '#fd8d3c', '#F03B20', '#BD0026']
-cmap = mcolors.ListedColormap(colors)
+# One map per column, with the break ranges as legend labels; neighborhoods without data are not drawn
+panels = [{'column': column, 'breaks': boundary_norms[column], 'missing': None,
+           'legend_title': f"{column} Percentage", 'title': f'{column} Percentage in Los Angeles County'}
+          for column in columns_to_plot]
 
-# Create the 3x2 grid of maps
+# Create the 3x2 grid of maps, all drawn from the same polygon paths; the empty last subplot is removed
 fig, axes = plt.subplots(nrows=3, ncols=2, figsize=(20, 30))
-axes = axes.flatten()
-
-# Plot each column
-for i, column in enumerate(columns_to_plot):
-    ax = axes[i]
-    norm = mcolors.BoundaryNorm(boundary_norms[column], cmap.N)
-
-    merged_gdf.plot(column=column, ax=ax, cmap=cmap, norm=norm, linewidth=0.8, edgecolor='0.8', legend=False)
-
-    # Create custom legend
-    legend_labels = [f'{boundary_norms[column][j]}-{boundary_norms[column][j+1]}' for j in range(len(boundary_norms[column])-1)] + ['Missing']
-    legend_colors = [plt.cm.ScalarMappable(norm=norm, cmap=cmap).to_rgba(boundary_norms[column][j]) for j in range(len(boundary_norms[column])-1)] + ['grey']
-    patches = [Patch(color=color, label=label) for color, label in zip(legend_colors, legend_labels)]
-    ax.legend(handles=patches, title=f"{column} Percentage", loc='lower left')
-
-    # Set title and remove axis
-    ax.set_title(f'{column} Percentage in Los Angeles County', fontsize=20)
-    ax.axis('off')
-
-# If the number of plots is odd, remove the last empty subplot
-if len(columns_to_plot) % 2 != 0:
-    fig.delaxes(axes[-1])
+draw_choropleths(merged_gdf, panels, axes)
 
 # Adjust layout and save the figure
 plt.tight_layout()
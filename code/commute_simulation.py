@@ -1,84 +1,49 @@
-import numpy as np
 import osmnx as ox
-import networkx as nx
-import geopandas as gpd
-import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
-from shapely.geometry import LineString
+from road_network import build_road_network, edge_chains
+from roadway_reader import read_roadways
+from overlay import load_overlay, aggregate_pieces
+from road_render import draw_edges
+from data_store import load_neighborhoods
+from effect_model import simulate_effects, EFFECT_COLUMNS
+from instrument import stage
+from exposure_rules import exposure_masks
 
 # Configure osmnx
 ox.settings.use_cache = True
 ox.settings.log_console = True
 
 # Load data
-geojson_url = 'https://raw.githubusercontent.com/XuZiHan-010/dissertation_2024/main/data/los-angeles-county.geojson'
-merged_data_url = 'https://raw.githubusercontent.com/XuZiHan-010/dissertation_2024/main/data/merged_data_converted.csv'
 roadway_path = 'data/roadway/los-angeles-county-freeways.shp'
 
-gdf = gpd.read_file(geojson_url)
-roadways = gpd.read_file(roadway_path).to_crs(gdf.crs)
-merged_data = pd.read_csv(merged_data_url)
-gdf = gdf.merge(merged_data, on='name', how='left')
-
-# Create a graph from roadway data
-G = nx.Graph()
-for idx, row in roadways.iterrows():
-    if isinstance(row.geometry, LineString):
-        coords = list(row.geometry.coords)
-        for i in range(len(coords) - 1):
-            G.add_edge(coords[i], coords[i + 1], length=LineString([coords[i], coords[i + 1]]).length)
-
-# Assign CRS to the graph
-G.graph['crs'] = roadways.crs
-
-def simulate_changes(G, gdf):
-    # Adding effect breakdown
-    effect_summary = {'income_effect': [], 'density_effect': [], 'ev_effect': [], 'transit_effect': [],
-                      'drive_effect': []}
-
-    for (u, v, data) in G.edges(data=True):
-        local_data = gdf[gdf['geometry'].intersects(LineString([u, v]))]
-        if local_data.empty:
-            continue
-
-        initial_pm25 = local_data['PM2.5 Concentration'].mean()
-        income_mod = np.log1p(local_data['Median Household Income'].mean() / 100000)
-        density_mod = np.log1p(local_data['Population Density'].mean() / 1000)
-
-        # Individual effects
-        transit_effect = -0.03 * income_mod
-        ev_effect = 0.07 * income_mod
-        active_travel_effect = 0.04 * density_mod
-        solo_drive_effect = -0.06 * income_mod
-        short_commute_effect = 0.05 * (density_mod if local_data['Public Transit'].mean() > 0.1 else 0)
-
-        # Store effects
-        effect_summary['income_effect'].append(transit_effect + ev_effect + solo_drive_effect)
-        effect_summary['density_effect'].append(active_travel_effect)
-        effect_summary['ev_effect'].append(ev_effect)
-        effect_summary['transit_effect'].append(transit_effect)
-        effect_summary['drive_effect'].append(solo_drive_effect)
-
-        # Apply total effect
-        total_effect = sum([transit_effect, ev_effect, active_travel_effect, solo_drive_effect, short_commute_effect])
-        simulated_pm25 = max(0, initial_pm25 * (1 + total_effect))
-        data['pm25_reduction'] = initial_pm25 - simulated_pm25
-
-        # Assign color based on the simulation result
-        if simulated_pm25 < 12 and initial_pm25 < 12:
-            data['simulated_pm25_color'] = '#1a9641'
-        elif simulated_pm25 < 12 and initial_pm25 >= 12:
-            data['simulated_pm25_color'] = '#d7191c'
-        elif simulated_pm25 >= 12 and initial_pm25 >= 12:
-            data['simulated_pm25_color'] = '#fdae61'
-        else:
-            data['simulated_pm25_color'] = '#ffffbf'
-
-    return G, effect_summary
+gdf = load_neighborhoods()
+roadways = read_roadways(roadway_path, crs=gdf.crs)
+
+# Create the road network edge table from roadway data
+network = build_road_network(roadways)
+
+def simulate_changes(network, gdf):
+    # Weight every neighborhood by the length of the edge that falls inside it
+    overlay = load_overlay(network, gdf)
+
+    # Run the effect model on the edges with freeway length inside at least one neighborhood,
+    # once per piece of a degree-2 chain lying in a single neighborhood
+    covered, piece, attributes = aggregate_pieces(overlay, gdf, edge_chains(network))
+    result = simulate_effects(attributes['PM2.5 Concentration'], attributes['Median Household Income'],
+                              attributes['Population Density'], attributes['Public Transit'])
+
+    # Adding effect breakdown, carried back to every edge
+    effect_summary = {column: result[column][piece] for column in EFFECT_COLUMNS}
+
+    # Per-edge results of the simulated edges
+    simulated = {'edge': covered, 'pm25_reduction': result['pm25_reduction'][piece],
+                 'color_class': result['color_class'][piece]}
+
+    return simulated, effect_summary
 
 # Run the simulation
-G_simulated, effect_summary = simulate_changes(G, gdf)
+simulated, effect_summary = simulate_changes(network, gdf)
 
 # Visualization for Simulated PM2.5 levels
 fig, ax = plt.subplots(figsize=(12, 10))  # Adjust size as necessary
@@ -87,19 +52,15 @@ fig, ax = plt.subplots(figsize=(12, 10))  # Adjust size as necessary
 gdf.plot(ax=ax, color='lightgray')  # Basemap of LA County
 
 # Highlight the specific areas with high and low exposure using shading
-high_exposure_mask = gdf['name'].isin(['Del Aire', 'Harbor Gateway', 'Hawthorne', 'Lawndale', 'West Carson'])
-low_exposure_mask = gdf['name'].isin(['Commerce', 'Diamond Bar', 'Elysian Park', 'Hollywood Hills', 'Industry', 'Irwindale', 'Ladera Heights', 'Rancho Dominguez', 'Santa Fe Springs', 'Vernon', 'Veterans Administration', 'Whittier Narrows'])
+exposure = exposure_masks(gdf)
+high_exposure_mask = exposure['high']
+low_exposure_mask = exposure['low']
 
 gdf[high_exposure_mask].plot(ax=ax, color='blue', alpha=0.5, edgecolor='black', label='High Exposure Areas')
 gdf[low_exposure_mask].plot(ax=ax, color='purple', alpha=0.5, edgecolor='black', label='Low Exposure Areas')
 
 # Overlay the simulated PM2.5 reductions with distinct colors
-for (u, v, data) in G_simulated.edges(data=True):
-    if 'simulated_pm25_color' in data:
-        color = data['simulated_pm25_color']
-        line = LineString([u, v])
-        xs, ys = line.xy
-        ax.plot(xs, ys, color=color, linewidth=2)
+draw_edges(ax, network.edge_coords[simulated['edge']], simulated['color_class'], linewidth=2)
 
 # Add neighborhood labels with arrows pointing to their approximate locations
 neighborhoods = {
@@ -163,5 +124,6 @@ ax.legend(handles=legend_elements_simulated, loc='upper right')
 
 # Save and show the figure
 plt.tight_layout()
-plt.savefig('figure/simulation_area_singlery.png', dpi=800, bbox_inches='tight')
+with stage('savefig'):
+    plt.savefig('figure/simulation_area_singlery.png', dpi=800, bbox_inches='tight')
 plt.show()
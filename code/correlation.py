@@ -0,0 +1,134 @@
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.stats import rankdata
+
+METHODS = ['pearson', 'spearman']
+
+
+def group_values(table, masks, columns):
+    # Rows of every subgroup as an (n, p) array, leaving out rows with missing values
+    values = table[columns].to_numpy(dtype=float)
+    complete = ~np.isnan(values).any(axis=1)
+    return {name: values[np.asarray(mask, dtype=bool) & complete] for name, mask in masks.items()}
+
+
+def transform(values, method):
+    # Spearman is Pearson on the ranks within each column (ties get their average rank)
+    return rankdata(values, axis=-2) if method == 'spearman' else values
+
+
+def standardize(values):
+    # Columns centered and scaled to unit norm, so Z.T @ Z is the correlation matrix
+    centered = values - values.mean(axis=-2, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return centered / np.sqrt((centered ** 2).sum(axis=-2, keepdims=True))
+
+
+def correlation_matrices(table, masks, columns, method='pearson'):
+    """Correlation matrix of `columns` within each subgroup, like DataFrame.corr() per subset.
+
+    Every subgroup is ranked (Spearman) and standardized once, zero-padded
+    into one (groups, rows, columns) array, and all matrices come from a
+    single batched product. A column that is constant within a subgroup
+    gives NaN correlations there, and so does every pair in a subgroup of
+    fewer than two rows.
+    """
+    groups = group_values(table, masks, columns)
+    stacked = np.zeros((len(groups), max([len(values) for values in groups.values()] + [1]), len(columns)))
+    for position, values in enumerate(groups.values()):
+        if len(values) >= 2:
+            stacked[position, :len(values)] = standardize(transform(values, method))
+    matrices = np.einsum('gnp,gnq->gpq', stacked, stacked)
+    # Left as zero padding these would read as r=0, but the correlation is undefined
+    matrices[[len(values) < 2 for values in groups.values()]] = np.nan
+    return {name: pd.DataFrame(matrix, index=columns, columns=columns) for name, matrix in zip(groups, matrices)}
+
+
+def _bootstrap_batch(values, method, seed, n_resamples):
+    # Correlation matrices of resamples drawn with replacement, ranked within each resample
+    rng = np.random.default_rng(seed)
+    sample = values[rng.integers(0, len(values), size=(n_resamples, len(values)))]
+    z = standardize(transform(sample, method))
+    return np.einsum('bnp,bnq->bpq', z, z)
+
+
+def _permutation_batch(values, method, seed, n_resamples, observed):
+    # How often independently shuffled columns correlate at least as strongly as observed.
+    # Ranks and standardization do not change under shuffling, so they are done once.
+    rng = np.random.default_rng(seed)
+    n, p = values.shape
+    z = standardize(transform(values, method))
+    order = rng.random((n_resamples, n, p)).argsort(axis=1)
+    shuffled = np.take_along_axis(np.broadcast_to(z, (n_resamples, n, p)), order, axis=1)
+    null = np.einsum('bnp,bnq->bpq', shuffled, shuffled)
+    return (np.abs(null) >= np.abs(observed) - 1e-12).sum(axis=0)
+
+
+def correlation_table(table, masks, columns, methods=METHODS, n_resamples=10000, confidence=0.95, seed=0,
+                      batch_size=1000, workers=None):
+    """Correlations of every column pair in every subgroup with their uncertainty.
+
+    For each subgroup and method this adds a percentile bootstrap confidence
+    interval and a two-sided permutation p-value, each from `n_resamples`
+    batched resamples. Batches run across a process pool (in-process for
+    workers=1). Batch i of each (group, method, kind) always draws from the
+    same child of SeedSequence(seed), so results do not depend on the
+    number of workers. Returns one row per (group, method, column pair);
+    subgroups of fewer than two rows are not resampled and get NaN.
+    """
+    groups = group_values(table, masks, columns)
+    observed = {method: correlation_matrices(table, masks, columns, method) for method in methods}
+    sizes = [min(batch_size, n_resamples - start) for start in range(0, n_resamples, batch_size)]
+    seeds = iter(np.random.SeedSequence(seed).spawn(2 * len(groups) * len(methods) * len(sizes)))
+
+    tasks = []
+    for name, values in groups.items():
+        if len(values) < 2:
+            continue
+        for method in methods:
+            for size in sizes:
+                tasks.append((name, method, 'bootstrap', _bootstrap_batch, (values, method, next(seeds), size)))
+            matrix = observed[method][name].to_numpy()
+            for size in sizes:
+                tasks.append((name, method, 'permutation', _permutation_batch,
+                              (values, method, next(seeds), size, matrix)))
+
+    if workers == 1:
+        results = [function(*args) for _, _, _, function, args in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            futures = [pool.submit(function, *args) for _, _, _, function, args in tasks]
+            results = [future.result() for future in futures]
+
+    bootstrap, exceed = {}, {}
+    for (name, method, kind, _, _), result in zip(tasks, results):
+        if kind == 'bootstrap':
+            bootstrap.setdefault((name, method), []).append(result)
+        else:
+            exceed[name, method] = exceed.get((name, method), 0) + result
+
+    upper = np.triu_indices(len(columns), k=1)
+    alpha = (1 - confidence) / 2
+    rows = []
+    for name, values in groups.items():
+        for method in methods:
+            if n_resamples and len(values) >= 2:
+                with warnings.catch_warnings():
+                    # Pairs with a column constant in the subgroup have no finite resample
+                    warnings.simplefilter('ignore', RuntimeWarning)
+                    low, high = np.nanquantile(np.concatenate(bootstrap[name, method]), [alpha, 1 - alpha], axis=0)
+                matrix = observed[method][name].to_numpy()
+                p_value = np.where(np.isnan(matrix), np.nan, (exceed[name, method] + 1) / (n_resamples + 1))
+            else:
+                low = high = p_value = np.full((len(columns), len(columns)), np.nan)
+            rows.append(pd.DataFrame({
+                'group': name, 'method': method, 'n': len(values),
+                'column_x': np.array(columns)[upper[0]], 'column_y': np.array(columns)[upper[1]],
+                'r': observed[method][name].to_numpy()[upper], 'ci_low': low[upper], 'ci_high': high[upper],
+                'p_value': p_value[upper],
+            }))
+    return pd.concat(rows, ignore_index=True)
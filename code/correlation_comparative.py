@@ -1,27 +1,18 @@
-import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
-import geopandas as gpd
 from matplotlib import patheffects
+from data_store import load_neighborhoods
+from exposure_rules import exposure_masks
+from roadway_reader import read_roadways
 
-# Load the GeoJSON and CSV data
-geojson_url = 'https://raw.githubusercontent.com/XuZiHan-010/dissertation_2024/main/data/los-angeles-county.geojson'
-merged_data_url = 'https://raw.githubusercontent.com/XuZiHan-010/dissertation_2024/main/data/merged_data_converted.csv'
-
-# Load the data
-gdf = gpd.read_file(geojson_url)
-merged_data = pd.read_csv(merged_data_url)
+# Load the neighborhoods merged with the converted data (numeric columns already coerced)
+merged_gdf = load_neighborhoods()
 roadway_path = 'data/roadway/los-angeles-county-freeways.shp'
 
-roadways = gpd.read_file(roadway_path)
-
-# Ensure the CRS matches between the GeoDataFrames
-roadways = roadways.to_crs(gdf.crs)
+# Only the geometry is drawn, read straight into the neighborhoods' CRS
+roadways = read_roadways(roadway_path, crs=merged_gdf.crs)
 
-# Merge the GeoDataFrame with the CSV data on the appropriate key
-merged_gdf = gdf.merge(merged_data, left_on='name', right_on='name', how='left')
-
-# Convert relevant columns to numeric values and handle missing data
+# Columns of interest
 columns_to_convert = [
     'Vehicle Ownership', 'Drives Alone', 'Public Transit',
     'Traffic Impacts Percentile', 'PM2.5 Concentration', 'total_ev_count',
@@ -29,27 +20,13 @@ columns_to_convert = [
     'Median Household Income', 'Unemployment Rate', 'Bachelor\'s Degree or Higher',
     'Commute Time Below 30 Minutes','Population Density'
 ]
-for col in columns_to_convert:
-    merged_gdf[col] = pd.to_numeric(merged_gdf[col], errors='coerce')
-
 # Drop rows with missing values in any of the columns of interest
 merged_gdf.dropna(subset=columns_to_convert, inplace=True)
 
-# Identify high and low exposure areas
-high_exposure_areas = merged_gdf[
-    (merged_gdf['PM2.5 Concentration'] >= 12) &
-    (merged_gdf['Traffic Impacts Percentile'] >= 66) &
-    ((merged_gdf['Vehicle Ownership'] >= 0.9) & (merged_gdf['Drives Alone'] >= 0.7)) &
-    (merged_gdf['Commute Time Below 30 Minutes'] >= 0.55) & (merged_gdf['Population Density'] >= 1000)
-]
-
-low_exposure_areas_new = merged_gdf[
-    (merged_gdf['PM2.5 Concentration'] >= 12) &
-    (merged_gdf['Traffic Impacts Percentile'] >= 66) &
-   ((((merged_gdf['Drives Alone'] >= 0.7) & (merged_gdf['Population Density'] <= 914)) |
-      (merged_gdf['Drives Alone'] <= 0.65)) | (merged_gdf['Vehicle Ownership'] <= 0.9)) &
-      (merged_gdf['Population Density'] <= 913)
-]
+# Identify high and low exposure areas with the shared exposure rules
+exposure = exposure_masks(merged_gdf)
+high_exposure_areas = merged_gdf[exposure['high']]
+low_exposure_areas_new = merged_gdf[exposure['low']]
 
 # High Exposure Areas Plot
 fig, ax = plt.subplots(figsize=(12, 8))
@@ -0,0 +1,77 @@
+import hashlib
+import os
+import urllib.request
+from pathlib import Path
+
+import geopandas as gpd
+import pandas as pd
+
+from instrument import instrumented
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+SNAPSHOT_DIR = DATA_DIR / 'snapshots'
+REMOTE_DATA_URL = 'https://raw.githubusercontent.com/XuZiHan-010/dissertation_2024/main/data/'
+
+GEOJSON_NAME = 'los-angeles-county.geojson'
+CONVERTED_DATA_NAME = 'merged_data_converted.csv'
+
+# Bump when the way snapshots are built changes, so older snapshots are not reused
+SNAPSHOT_VERSION = 1
+
+
+def source_path(name):
+    """Local path of a data file, downloaded once from the repository if missing."""
+    path = DATA_DIR / name
+    if not path.exists():
+        urllib.request.urlretrieve(REMOTE_DATA_URL + urllib.request.quote(name), path)
+    return path
+
+
+def content_hash(paths):
+    digest = hashlib.sha256(str(SNAPSHOT_VERSION).encode())
+    for path in paths:
+        digest.update(Path(path).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def to_numeric(series):
+    # Percentage strings such as '7%' become 7.0, anything unparsable becomes NaN
+    if not pd.api.types.is_numeric_dtype(series):
+        series = series.astype(str).str.strip().str.rstrip('%')
+    return pd.to_numeric(series, errors='coerce')
+
+
+def build_neighborhoods(geojson_path, data_path):
+    gdf = gpd.read_file(geojson_path)
+    if gdf.crs is None:
+        gdf = gdf.set_crs(epsg=4326)
+    data = pd.read_csv(data_path)
+    value_columns = data.columns.drop('name')
+    data[value_columns] = data[value_columns].apply(to_numeric)
+    return gdf.merge(data, on='name', how='left')
+
+
+@instrumented('load_neighborhoods', lambda gdf: {'polygons': len(gdf)})
+def load_neighborhoods(dataset=CONVERTED_DATA_NAME):
+    """LA County neighborhood polygons merged with a neighborhood dataset on 'name'.
+
+    The merged GeoDataFrame is stored as an uncompressed Feather snapshot under
+    data/snapshots, keyed by a hash of the source files, and memory-mapped on
+    later runs.
+    """
+    sources = [source_path(GEOJSON_NAME), source_path(dataset)]
+    stem = Path(dataset).stem
+    snapshot = SNAPSHOT_DIR / f'{stem}-{content_hash(sources)}.feather'
+    if snapshot.exists():
+        return gpd.read_feather(snapshot, memory_map=True)
+
+    gdf = build_neighborhoods(*sources)
+    SNAPSHOT_DIR.mkdir(exist_ok=True)
+    for stale in SNAPSHOT_DIR.glob(f'{stem}-*.feather'):
+        if stale != snapshot:
+            stale.unlink(missing_ok=True)
+    # Write to a temporary file first so concurrent readers never see a partial snapshot
+    partial = snapshot.with_name(f'{snapshot.name}.{os.getpid()}.tmp')
+    gdf.to_feather(partial, compression='uncompressed')
+    partial.replace(snapshot)
+    return gdf
@@ -0,0 +1,72 @@
+import numpy as np
+
+from instrument import instrumented
+
+# Neighborhood attributes aggregated onto each road edge
+EDGE_ATTRIBUTES = ['PM2.5 Concentration', 'Median Household Income', 'Population Density', 'Public Transit']
+
+# Effect coefficients of the policy model
+COEFFICIENTS = {
+    'transit': -0.03,
+    'ev': 0.07,
+    'active_travel': 0.04,
+    'solo_drive': -0.06,
+    'short_commute': 0.05,
+    'transit_threshold': 0.1,
+}
+
+EFFECT_COLUMNS = ['income_effect', 'density_effect', 'ev_effect', 'transit_effect', 'drive_effect']
+
+# Color classes, indexed by the `color_class` codes returned by simulate_effects
+PM25_THRESHOLD = 12
+COLOR_CLASSES = ['#1a9641', '#d7191c', '#fdae61', '#ffffbf']
+REMAIN_BELOW, IMPROVED, REMAIN_ABOVE, MISSING = range(4)
+
+
+@instrumented('simulate_effects', lambda result: {'edges': len(result['color_class'])})
+def simulate_effects(pm25, income, density, transit, coefficients=COEFFICIENTS):
+    """Evaluate the PM2.5 effect model for all edges at once.
+
+    Inputs are per-edge arrays of aggregated PM2.5, median household income,
+    population density and public transit share. Returns a dict of arrays with
+    the five `effect_summary` columns plus `initial_pm25`, `simulated_pm25`,
+    `pm25_reduction` and the `color_class` code into COLOR_CLASSES.
+    """
+    pm25 = np.asarray(pm25, dtype=float)
+    income_mod = np.log1p(np.asarray(income, dtype=float) / 100000)
+    density_mod = np.log1p(np.asarray(density, dtype=float) / 1000)
+    transit = np.asarray(transit, dtype=float)
+
+    # Individual effects
+    transit_effect = coefficients['transit'] * income_mod
+    ev_effect = coefficients['ev'] * income_mod
+    active_travel_effect = coefficients['active_travel'] * density_mod
+    solo_drive_effect = coefficients['solo_drive'] * income_mod
+    short_commute_effect = coefficients['short_commute'] * np.where(
+        transit > coefficients['transit_threshold'], density_mod, 0)
+
+    # Apply total effect; like max(0, x), a NaN result is clamped to 0
+    total_effect = transit_effect + ev_effect + active_travel_effect + solo_drive_effect + short_commute_effect
+    raw_pm25 = pm25 * (1 + total_effect)
+    simulated_pm25 = np.where(raw_pm25 > 0, raw_pm25, 0.0)
+
+    # Assign color class based on the simulation result
+    below_before = pm25 < PM25_THRESHOLD
+    above_before = pm25 >= PM25_THRESHOLD
+    color_class = np.select(
+        [(simulated_pm25 < PM25_THRESHOLD) & below_before,
+         (simulated_pm25 < PM25_THRESHOLD) & above_before,
+         (simulated_pm25 >= PM25_THRESHOLD) & above_before],
+        [REMAIN_BELOW, IMPROVED, REMAIN_ABOVE], default=MISSING).astype(np.int8)
+
+    return {
+        'income_effect': transit_effect + ev_effect + solo_drive_effect,
+        'density_effect': active_travel_effect,
+        'ev_effect': ev_effect,
+        'transit_effect': transit_effect,
+        'drive_effect': solo_drive_effect,
+        'initial_pm25': pm25,
+        'simulated_pm25': simulated_pm25,
+        'pm25_reduction': pm25 - simulated_pm25,
+        'color_class': color_class,
+    }
@@ -0,0 +1,211 @@
+import hashlib
+import json
+import operator
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_store import SNAPSHOT_DIR
+
+MASK_DIR = SNAPSHOT_DIR / 'exposure'
+
+# Columns of the comparative analysis; a neighborhood missing any of them is never classified
+ANALYSIS_COLUMNS = [
+    'Vehicle Ownership', 'Drives Alone', 'Public Transit',
+    'Traffic Impacts Percentile', 'PM2.5 Concentration', 'total_ev_count',
+    'Bikes or Walks', 'Carpools', 'Works from Home',
+    'Median Household Income', 'Unemployment Rate', 'Bachelor\'s Degree or Higher',
+    'Commute Time Below 30 Minutes', 'Population Density'
+]
+
+# A rule is a comparison (column, operator, threshold), {'complete': [columns]} for rows
+# without missing values in those columns, or {'all': [...]}, {'any': [...]}, {'not': rule}
+HIGH_EXPOSURE = {'all': [
+    {'complete': ANALYSIS_COLUMNS},
+    ('PM2.5 Concentration', '>=', 12),
+    ('Traffic Impacts Percentile', '>=', 66),
+    ('Vehicle Ownership', '>=', 0.9),
+    ('Drives Alone', '>=', 0.7),
+    ('Commute Time Below 30 Minutes', '>=', 0.55),
+    ('Population Density', '>=', 1000),
+]}
+
+LOW_EXPOSURE = {'all': [
+    {'complete': ANALYSIS_COLUMNS},
+    ('PM2.5 Concentration', '>=', 12),
+    ('Traffic Impacts Percentile', '>=', 66),
+    {'any': [
+        {'all': [('Drives Alone', '>=', 0.7), ('Population Density', '<=', 914)]},
+        ('Drives Alone', '<=', 0.65),
+        ('Vehicle Ownership', '<=', 0.9),
+    ]},
+    ('Population Density', '<=', 913),
+]}
+
+EXPOSURE_RULES = {'high': HIGH_EXPOSURE, 'low': LOW_EXPOSURE}
+
+OPERATORS = {'>=': operator.ge, '>': operator.gt, '<=': operator.le, '<': operator.lt, '==': operator.eq,
+             '!=': operator.ne}
+
+# Masks already evaluated in this process, by table key and rule hash
+_masks = {}
+
+
+def canonical(rule):
+    # JSON-compatible form of a rule, identical for equal rules
+    if isinstance(rule, dict):
+        (kind, body), = rule.items()
+        if kind == 'not':
+            return {'not': canonical(body)}
+        if kind == 'complete':
+            return {'complete': sorted(body)}
+        return {kind: [canonical(part) for part in body]}
+    column, op, value = rule
+    if op not in OPERATORS:
+        raise ValueError(f'unknown operator {op!r} in rule on {column!r}')
+    return [column, op, float(value)]
+
+
+def rule_hash(rule):
+    return hashlib.sha256(json.dumps(canonical(rule), sort_keys=True).encode()).hexdigest()[:16]
+
+
+def rule_columns(rule):
+    if isinstance(rule, dict):
+        (kind, body), = rule.items()
+        if kind == 'not':
+            return rule_columns(body)
+        if kind == 'complete':
+            return set(body)
+        return set().union(*[rule_columns(part) for part in body])
+    return {rule[0]}
+
+
+def compile_rules(rules):
+    """Split named rules into their distinct comparisons and a program combining them.
+
+    Returns (atoms, programs): atoms maps (column, operator) to the sorted
+    thresholds compared against that column; every program is a nested tuple
+    referring to atoms by (column, operator, position).
+    """
+    thresholds = {}
+
+    def collect(rule):
+        if isinstance(rule, dict):
+            (kind, body), = rule.items()
+            if kind == 'not':
+                collect(body)
+            elif kind != 'complete':
+                for part in body:
+                    collect(part)
+        else:
+            thresholds.setdefault((rule[0], rule[1]), set()).add(float(rule[2]))
+
+    def program(rule):
+        if isinstance(rule, dict):
+            (kind, body), = rule.items()
+            if kind == 'not':
+                return ('not', program(body))
+            if kind == 'complete':
+                return ('complete', tuple(sorted(body)))
+            return (kind, tuple(program(part) for part in body))
+        column, op, value = rule
+        return ('atom', (column, op, atoms[column, op].index(float(value))))
+
+    for rule in rules.values():
+        collect(rule)
+    atoms = {key: sorted(values) for key, values in thresholds.items()}
+    return atoms, {name: program(rule) for name, rule in rules.items()}
+
+
+def evaluate_program(program, results, table):
+    kind, body = program
+    if kind == 'atom':
+        column, op, position = body
+        return results[column, op][position]
+    if kind == 'complete':
+        return table[list(body)].notna().all(axis=1).to_numpy()
+    if kind == 'not':
+        return ~evaluate_program(body, results, table)
+    parts = [evaluate_program(part, results, table) for part in body]
+    return np.logical_and.reduce(parts) if kind == 'all' else np.logical_or.reduce(parts)
+
+
+def table_key(table, columns):
+    # Hash of the rows (by name) and the values of the columns the rules read
+    frame = table[['name'] + sorted(columns)]
+    return hashlib.sha256(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes()).hexdigest()[:16]
+
+
+def evaluate_rules(table, rules, cache=True):
+    """Boolean mask of the rows of `table` matching each named rule.
+
+    All rules are evaluated together: every column is compared with all the
+    thresholds used on it in one broadcast, and the rules then only combine
+    those rows. Missing values never satisfy a comparison. Masks are cached
+    in memory and under data/snapshots/exposure, keyed by the rule hash and a
+    hash of the table columns the rules read. Set `cache` to False for
+    one-off rules such as large threshold sweeps.
+    """
+    columns = set().union(*[rule_columns(rule) for rule in rules.values()]) if rules else set()
+    key = table_key(table, columns)
+    hashes = {name: rule_hash(rule) for name, rule in rules.items()}
+    masks = {}
+    for name, digest in hashes.items():
+        path = MASK_DIR / f'{key}-{digest}.npy'
+        if (key, digest) in _masks:
+            masks[name] = _masks[key, digest]
+        elif cache and path.exists():
+            masks[name] = _masks[key, digest] = np.load(path)
+
+    pending = {name: rule for name, rule in rules.items() if name not in masks}
+    if pending:
+        atoms, programs = compile_rules(pending)
+        results = {}
+        for (column, op), thresholds in atoms.items():
+            values = table[column].to_numpy(dtype=float)
+            results[column, op] = OPERATORS[op](values[None, :], np.array(thresholds)[:, None])
+        for name, program in programs.items():
+            mask = evaluate_program(program, results, table)
+            masks[name] = mask
+            if cache:
+                _masks[key, hashes[name]] = mask
+                MASK_DIR.mkdir(parents=True, exist_ok=True)
+                path = MASK_DIR / f'{key}-{hashes[name]}.npy'
+                # One temporary file per process; scripts built in parallel write the same masks
+                partial = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+                with open(partial, 'wb') as file:
+                    np.save(file, mask)
+                try:
+                    partial.replace(path)
+                except OSError:
+                    # Another process wrote the same mask first, which is as good as a cache hit
+                    partial.unlink(missing_ok=True)
+                    if not path.exists():
+                        raise
+    return {name: masks[name] for name in rules}
+
+
+def exposure_masks(table, rules=EXPOSURE_RULES):
+    """High and low exposure masks of the neighborhoods used by every script."""
+    return evaluate_rules(table, rules)
+
+
+def with_threshold(rule, column, op, value):
+    """Copy of a rule with every (column, op, threshold) comparison set to `value`."""
+    if isinstance(rule, dict):
+        (kind, body), = rule.items()
+        if kind == 'not':
+            return {'not': with_threshold(body, column, op, value)}
+        if kind == 'complete':
+            return rule
+        return {kind: [with_threshold(part, column, op, value) for part in body]}
+    return (column, op, value) if rule[:2] == (column, op) else rule
+
+
+def threshold_sweep(table, rule, column, op, values, cache=False):
+    """Rows matching `rule` for each threshold of one comparison, as a (values x rows) array."""
+    rules = {value: with_threshold(rule, column, op, value) for value in values}
+    masks = evaluate_rules(table, rules, cache=cache)
+    return np.stack([masks[value] for value in values]) if len(values) else np.zeros((0, len(table)), bool)
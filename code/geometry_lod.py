@@ -0,0 +1,98 @@
+import os
+
+import numpy as np
+import geopandas as gpd
+import shapely
+
+from data_store import GEOJSON_NAME, SNAPSHOT_DIR, content_hash, source_path
+
+# Simplification tolerances of the levels of detail, in CRS units (degrees for the LA GeoJSON)
+LOD_TOLERANCES = [0.0001, 0.0005, 0.002, 0.01]
+
+
+def level_column(tolerance):
+    return f'lod_{tolerance:g}'
+
+
+def build_levels(gdf, tolerances=LOD_TOLERANCES):
+    """Exact geometry plus topology-preserving simplified versions at each tolerance.
+
+    Every level also stores the Hausdorff distance of each simplified polygon
+    from its exact geometry in `deviation_<tolerance>`, which is what level
+    selection and coarse filtering rely on.
+    """
+    exact = gdf.geometry.values
+    levels = gpd.GeoDataFrame({'slug': gdf['slug'].to_numpy()}, geometry=exact, crs=gdf.crs)
+    for tolerance in tolerances:
+        simplified = shapely.simplify(exact, tolerance, preserve_topology=True)
+        levels[level_column(tolerance)] = gpd.GeoSeries(simplified, crs=gdf.crs)
+        levels[f'deviation_{tolerance:g}'] = shapely.hausdorff_distance(exact, simplified)
+    return levels
+
+
+def load_levels(tolerances=LOD_TOLERANCES):
+    """Levels of detail of the neighborhood polygons, cached under data/snapshots."""
+    source = source_path(GEOJSON_NAME)
+    key = content_hash([source]) + '-' + '-'.join(f'{tolerance:g}' for tolerance in tolerances)
+    snapshot = SNAPSHOT_DIR / f'{source.stem}-lod-{key}.feather'
+    if snapshot.exists():
+        return gpd.read_feather(snapshot, memory_map=True)
+
+    levels = build_levels(gpd.read_file(source), tolerances)
+    SNAPSHOT_DIR.mkdir(exist_ok=True)
+    # Per-process temporary file, as in data_store, so parallel figure scripts do not share one
+    partial = snapshot.with_name(f'{snapshot.name}.{os.getpid()}.tmp')
+    levels.to_feather(partial, compression='uncompressed')
+    try:
+        partial.replace(snapshot)
+    except OSError:
+        # Another process wrote the same snapshot first, and it may hold it memory-mapped
+        partial.unlink(missing_ok=True)
+        if not snapshot.exists():
+            raise
+    return levels
+
+
+def select_level(levels, tolerance):
+    """Column of the coarsest level whose largest deviation is within `tolerance`."""
+    within = [(levels[column].max(), 'lod_' + column[len('deviation_'):])
+              for column in levels.columns if column.startswith('deviation_')]
+    within = [level for level in within if level[0] <= tolerance]
+    return max(within)[1] if within else 'geometry'
+
+
+def pixel_size(bounds, width_inches, dpi):
+    # Width of one output pixel in CRS units when `bounds` fill `width_inches`
+    return (bounds[2] - bounds[0]) / (width_inches * dpi)
+
+
+def plotting_frame(gdf, width_inches, dpi, levels=None):
+    """Copy of `gdf` drawing the cheapest level that stays within one output pixel."""
+    levels = load_levels() if levels is None else levels
+    column = select_level(levels, pixel_size(gdf.total_bounds, width_inches, dpi))
+    if column == 'geometry':
+        return gdf
+    geometry = gdf['slug'].map(levels.set_index('slug')[column])
+    return gdf.set_geometry(gpd.GeoSeries(geometry.to_numpy(), index=gdf.index, crs=gdf.crs))
+
+
+def query_levels(levels, geometries, tolerance, predicate='intersects'):
+    """Spatial query refining a coarse-level filter with the exact polygons.
+
+    Candidates come from the coarsest level within `tolerance`, with each
+    simplified polygon grown by its own deviation so no true match is missed.
+    Only the candidate pairs are tested against the exact geometry. Returns
+    (input_idx, poly_idx) pairs like GeoDataFrame.sindex.query.
+    """
+    column = select_level(levels, tolerance)
+    exact = levels.geometry.values
+    if column == 'geometry':
+        coarse = exact
+    else:
+        deviation = levels['deviation_' + column[len('lod_'):]].to_numpy()
+        # Mitre joins keep the grown polygon a superset of the round buffer
+        coarse = shapely.buffer(levels[column].values, deviation, join_style='mitre')
+    geometries = np.asarray(geometries)
+    input_idx, poly_idx = shapely.STRtree(coarse).query(geometries, predicate='intersects')
+    keep = getattr(shapely, predicate)(geometries[input_idx], exact[poly_idx])
+    return input_idx[keep], poly_idx[keep]
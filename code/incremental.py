@@ -0,0 +1,173 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from data_store import SNAPSHOT_DIR, load_neighborhoods
+from effect_model import EDGE_ATTRIBUTES, EFFECT_COLUMNS, simulate_effects
+from overlay import aggregate_weighted, load_overlay, overlay_key
+from road_network import build_road_network
+from roadway_reader import read_roadways
+
+# Per-edge arrays of the simulation kept in the state and patched on every update
+RESULT_COLUMNS = EFFECT_COLUMNS + ['pm25_reduction', 'color_class']
+
+
+def simulate_rows(matrix, values, rows):
+    # Attributes and effect model outputs of the given covered edge rows, as a full simulate_changes pass gives them
+    _, attributes = aggregate_weighted(matrix[rows], values)
+    return attributes, simulate_effects(*[attributes[column] for column in EDGE_ATTRIBUTES])
+
+
+def make_state(names, matrix, values, covered, attributes, result):
+    # Derived parts of the state: inverted index, edge positions and the sums behind the effect means
+    position = np.full(matrix.shape[0], -1)
+    position[covered] = np.arange(len(covered))
+    sums = {column: np.nansum(result[column]) for column in EFFECT_COLUMNS}
+    counts = {column: np.count_nonzero(~np.isnan(result[column])) for column in EFFECT_COLUMNS}
+    return {
+        'names': pd.Index(names),
+        'matrix': matrix,
+        'index': matrix.tocsc(),
+        'values': values,
+        'covered': covered,
+        'position': position,
+        'attributes': attributes,
+        'result': result,
+        'sums': sums,
+        'counts': counts,
+        'effect_summary': {column: sums[column] / counts[column] for column in EFFECT_COLUMNS},
+    }
+
+
+def build_state(matrix, gdf):
+    """Simulation state for incremental updates, from the edge x neighborhood overlay matrix.
+
+    Holds the inverted index (the matrix in CSC form, whose column j lists
+    the edges touching neighborhood j), the neighborhood attribute values,
+    the per-edge attributes and results of the covered edges, and the
+    NaN-skipping sums and counts behind the `effect_summary` means.
+    """
+    covered = np.flatnonzero(np.diff(matrix.indptr))
+    values = pd.DataFrame({column: gdf[column].to_numpy(dtype=float) for column in EDGE_ATTRIBUTES})
+    attributes, result = simulate_rows(matrix, values, covered)
+    return make_state(gdf['name'].to_numpy(), matrix, values, covered, attributes,
+                      {column: result[column] for column in RESULT_COLUMNS})
+
+
+def state_path(network, gdf):
+    # Keyed by the overlay geometry and the neighborhood attribute values
+    digest = pd.util.hash_pandas_object(gdf[['name'] + EDGE_ATTRIBUTES], index=False).sum()
+    return SNAPSHOT_DIR / f'incremental-{overlay_key(network, gdf)}-{digest & 0xffffffffffff:012x}.npz'
+
+
+def save_state(state, path):
+    matrix = state['matrix']
+    arrays = {'matrix_data': matrix.data, 'matrix_indices': matrix.indices, 'matrix_indptr': matrix.indptr,
+              'matrix_shape': np.array(matrix.shape), 'names': state['names'].to_numpy(dtype=str),
+              'covered': state['covered']}
+    arrays.update({'value_' + column: state['values'][column].to_numpy() for column in EDGE_ATTRIBUTES})
+    arrays.update({'attribute_' + column: state['attributes'][column] for column in EDGE_ATTRIBUTES})
+    arrays.update({'result_' + column: state['result'][column] for column in RESULT_COLUMNS})
+    SNAPSHOT_DIR.mkdir(exist_ok=True)
+    # Per-process temporary file, which the stale sweep's incremental-*.npz glob in load_state does not match
+    partial = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    with open(partial, 'wb') as file:
+        np.savez(file, **arrays)
+    try:
+        partial.replace(path)
+    except OSError:
+        # Another process saved the same state first
+        partial.unlink(missing_ok=True)
+        if not path.exists():
+            raise
+
+
+def read_state(path):
+    with np.load(path) as arrays:
+        matrix = sparse.csr_matrix((arrays['matrix_data'], arrays['matrix_indices'], arrays['matrix_indptr']),
+                                   shape=tuple(arrays['matrix_shape']))
+        return make_state(arrays['names'], matrix,
+                          pd.DataFrame({column: arrays['value_' + column] for column in EDGE_ATTRIBUTES}),
+                          arrays['covered'],
+                          {column: arrays['attribute_' + column] for column in EDGE_ATTRIBUTES},
+                          {column: arrays['result_' + column] for column in RESULT_COLUMNS})
+
+
+def load_state(network, gdf):
+    """build_state for the network and neighborhoods, cached under data/snapshots."""
+    path = state_path(network, gdf)
+    if path.exists():
+        return read_state(path)
+    state = build_state(load_overlay(network, gdf), gdf)
+    for stale in SNAPSHOT_DIR.glob('incremental-*.npz'):
+        if stale != path:
+            stale.unlink(missing_ok=True)
+    save_state(state, path)
+    return state
+
+
+def affected_edges(state, neighborhoods):
+    """Covered edge rows touching any of the given neighborhood positions, from the inverted index."""
+    index = state['index']
+    rows = [index.indices[index.indptr[j]:index.indptr[j + 1]] for j in neighborhoods]
+    return np.unique(np.concatenate(rows)) if rows else np.array([], dtype=int)
+
+
+def update_neighborhoods(state, updates):
+    """Change neighborhood attributes and re-simulate only the edges touching them.
+
+    `updates` maps neighborhood names to {column: new value} for columns in
+    EDGE_ATTRIBUTES. The per-edge attributes and results in `state` are
+    patched for the affected edges, and `state['effect_summary']` means are
+    updated in place by swapping the old contributions of those edges for
+    the new ones. Returns the affected edge rows.
+    """
+    positions = state['names'].get_indexer(list(updates))
+    if (positions < 0).any():
+        raise KeyError(f'unknown neighborhoods: {[name for name, p in zip(updates, positions) if p < 0]}')
+    columns = {column for changes in updates.values() for column in changes}
+    if not columns <= set(EDGE_ATTRIBUTES):
+        raise KeyError(f'only {EDGE_ATTRIBUTES} feed the simulation, got {sorted(columns - set(EDGE_ATTRIBUTES))}')
+    for position, changes in zip(positions, updates.values()):
+        for column, value in changes.items():
+            state['values'].loc[position, column] = value
+
+    rows = affected_edges(state, positions)
+    if len(rows) == 0:
+        return rows
+    attributes, result = simulate_rows(state['matrix'], state['values'], rows)
+    at = state['position'][rows]
+    for column in EDGE_ATTRIBUTES:
+        state['attributes'][column][at] = attributes[column]
+    for column in RESULT_COLUMNS:
+        if column in EFFECT_COLUMNS:
+            old, new = state['result'][column][at], result[column]
+            state['sums'][column] += np.nansum(new) - np.nansum(old)
+            state['counts'][column] += np.count_nonzero(~np.isnan(new)) - np.count_nonzero(~np.isnan(old))
+            state['effect_summary'][column] = state['sums'][column] / state['counts'][column]
+        state['result'][column][at] = result[column]
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='What-if edit of neighborhood attributes with incremental re-simulation.')
+    parser.add_argument('--set', nargs=3, action='append', required=True, metavar=('NAME', 'COLUMN', 'VALUE'),
+                        help='new attribute value of a neighborhood (repeatable)')
+    args = parser.parse_args()
+
+    gdf = load_neighborhoods()
+    state = load_state(build_road_network(read_roadways(crs=gdf.crs)), gdf)
+    before = dict(state['effect_summary'])
+    updates = {}
+    for name, column, value in args.set:
+        updates.setdefault(name, {})[column] = float(value)
+    start = time.perf_counter()
+    rows = update_neighborhoods(state, updates)
+    elapsed = time.perf_counter() - start
+    print(f'{len(rows)} edges re-simulated in {elapsed * 1000:.1f} ms')
+    print(pd.DataFrame({'before': before, 'after': state['effect_summary']}))
@@ -0,0 +1,127 @@
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from data_store import DATA_DIR, SNAPSHOT_DIR
+
+INDICATOR_CACHE_DIR = SNAPSHOT_DIR / 'indicators'
+# Bump when the parsed layout changes, so older cached indicators are not reused
+INDICATOR_CACHE_VERSION = 2
+
+# Source file of every column of merged_data.csv, in column order
+INDICATOR_FILES = {
+    'total_pop': 'Total Population - 2022.xlsx',
+    'Average Household Size': 'Average Household Size - 2021.xlsx',
+    'total_ev_count': 'Total EV Charging Stations - 2024.xlsx',
+    'Unemployment Rate': 'Unemployment Rate - 2022.xlsx',
+    'Labor Force Participation Rate': 'Labor Force Participation Rate - 2022.xlsx',
+    'Median Earnings': 'Median Earnings - 2022.xlsx',
+    'Median Household Income': 'Median Household Income - 2022.xlsx',
+    'Public Transit': 'Public Transit - 2022.xlsx',
+    'Works from Home': 'Works from Home - 2022.xlsx',
+    'Bikes or Walks': 'Bikes or Walks - 2022.xlsx',
+    'Drives Alone': 'Drives Alone - 2022.xlsx',
+    'Carpools': 'Carpools - 2022.xlsx',
+    'PM2.5 Concentration': 'PM2.5.csv',
+    'White Population': 'White Population - 2022.xlsx',
+    'Bachelor\'s Degree or Higher': 'Bachelor\'s Degree or Higher - 2022.xlsx',
+    'Traffic Impacts Percentile': 'Traffic Impacts Percentile - 2021.xlsx',
+    'Vehicle Ownership': 'Vehicle Ownership - 2022.xlsx',
+    'Commute Time Above 30 Minutes': 'Commute Time Above 30 Minutes - 2022.xlsx',
+    'Associate\'s Degree': 'Associate\'s Degree - 2022.xlsx',
+}
+
+# Columns stored as percentage strings
+PERCENT_COLUMNS = ['White Population', 'Unemployment Rate', 'Labor Force Participation Rate', 'Public Transit',
+                   'Works from Home', 'Bikes or Walks', 'Drives Alone', 'Carpools', 'Bachelor\'s Degree or Higher',
+                   'Vehicle Ownership', 'Associate\'s Degree', 'Commute Time Above 30 Minutes']
+
+
+def file_fingerprint(path):
+    digest = hashlib.sha256(str(INDICATOR_CACHE_VERSION).encode())
+    digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def parse_indicator(path, column):
+    # Name and value columns, plus the year of every row when the file has one
+    reader = pd.read_csv if path.suffix == '.csv' else pd.read_excel
+    frame = reader(path)
+    return frame[['name'] + (['year'] if 'year' in frame else []) + [column]]
+
+
+def load_indicators(files=INDICATOR_FILES, data_dir=DATA_DIR, max_workers=None):
+    """Parse the indicator files, re-parsing only those that changed.
+
+    Each parsed indicator is cached as a Feather file keyed by the source
+    file's content fingerprint. Files without a valid cache entry are parsed in
+    a process pool. Returns a dict of column -> DataFrame(name, [year,] column).
+    """
+    INDICATOR_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    indicators, stale = {}, {}
+    for column, name in files.items():
+        path = data_dir / name
+        cached = INDICATOR_CACHE_DIR / f'{path.stem}-{file_fingerprint(path)}.feather'
+        if cached.exists():
+            indicators[column] = pd.read_feather(cached)
+        else:
+            stale[column] = (path, cached)
+
+    if stale:
+        columns = list(stale)
+        paths = [stale[column][0] for column in columns]
+        if len(stale) == 1:
+            parsed = [parse_indicator(paths[0], columns[0])]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                parsed = list(pool.map(parse_indicator, paths, columns))
+        for column, frame in zip(columns, parsed):
+            path, cached = stale[column]
+            for old in INDICATOR_CACHE_DIR.glob(f'{path.stem}-*.feather'):
+                if old != cached:
+                    old.unlink(missing_ok=True)
+            partial = cached.with_name(f'{cached.name}.{os.getpid()}.tmp')
+            frame.to_feather(partial)
+            partial.replace(cached)
+            indicators[column] = frame
+
+    return {column: indicators[column] for column in files}
+
+
+def build_merged_data(files=INDICATOR_FILES, data_dir=DATA_DIR, max_workers=None):
+    """Join all indicators on neighborhood name into the layout of merged_data.csv."""
+    indicators = load_indicators(files, data_dir, max_workers)
+    names = pd.Index(pd.concat([frame['name'] for frame in indicators.values()]).unique(), name='name')
+    columns = {column: frame.drop_duplicates('name').set_index('name')[column].reindex(names)
+               for column, frame in indicators.items()}
+    return pd.DataFrame(columns, index=names).reset_index()
+
+
+def percent_to_decimal(series):
+    # Percentage strings such as '7%' become 0.07; values that are already numeric are kept
+    if pd.api.types.is_numeric_dtype(series):
+        return series
+    text = series.str.strip().str.rstrip('%')
+    parsed = pd.to_numeric(text, errors='coerce') / 100
+    return parsed.fillna(pd.to_numeric(series.where(text.isna()), errors='coerce'))
+
+
+def convert_indicators(df):
+    """Percentage conversion, Vehicle Ownership inversion and Commute Time Below 30 Minutes."""
+    df = df.copy()
+    columns = [column for column in PERCENT_COLUMNS if column in df]
+    df[columns] = df[columns].apply(percent_to_decimal)
+    df['Vehicle Ownership'] = (1 - df['Vehicle Ownership']).round(2)
+    df['Commute Time Below 30 Minutes'] = (1 - df['Commute Time Above 30 Minutes']).round(2)
+    return df
+
+
+def add_population_density(df, geo_df):
+    # Population per square kilometer, with areas from a projected CRS
+    area = geo_df.to_crs(epsg=3395).set_index('name').geometry.area
+    area = area[~area.index.duplicated()]
+    df = df.copy()
+    df['Population Density'] = df['total_pop'] / (df['name'].map(area) / 1e6)
+    return df
@@ -0,0 +1,166 @@
+import atexit
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Report file; instrumentation is off unless it is set, e.g. PIPELINE_PROFILE=profile.json
+REPORT_ENV = 'PIPELINE_PROFILE'
+# Comma-separated stage names (or 'all') to run under cProfile, one .prof file per stage
+CPROFILE_ENV = 'PIPELINE_CPROFILE'
+
+_report_path = os.environ.get(REPORT_ENV) or None
+_profiled = set(filter(None, os.environ.get(CPROFILE_ENV, '').split(',')))
+_stages = {}
+_events = []
+_profilers = {}
+_profiling = False
+_origin = time.perf_counter()
+_lock = threading.Lock()
+
+
+def enabled():
+    return _report_path is not None
+
+
+def peak_rss_mb():
+    # Peak resident set size of the process so far, None where the resource module is missing
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def reset_peak_rss():
+    """Restart the peak RSS count from the current RSS, so peak_rss_mb covers only what follows.
+
+    Uses Linux's /proc/self/clear_refs; returns False where the peak cannot
+    be reset and peak_rss_mb stays the peak of the whole process.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+
+class _DisabledStage:
+    def __enter__(self):
+        return {}
+
+    def __exit__(self, *exc):
+        return False
+
+
+_DISABLED = _DisabledStage()
+
+
+class _Stage:
+    def __init__(self, name):
+        self.name = name
+        self.counts = {}
+
+    def __enter__(self):
+        global _profiling
+        self.profiler = None
+        if not _profiling and (self.name in _profiled or 'all' in _profiled):
+            # Only one profiler can be active, so stages nested in a profiled stage are covered by it
+            self.profiler = _profilers.setdefault(self.name, cProfile.Profile())
+            _profiling = True
+            self.profiler.enable()
+        self.rss = peak_rss_mb()
+        self.cpu = time.process_time()
+        self.wall = time.perf_counter()
+        return self.counts
+
+    def __exit__(self, *exc):
+        global _profiling
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        if self.profiler is not None:
+            self.profiler.disable()
+            _profiling = False
+        record(self.name, self.wall, wall, cpu, self.rss, peak_rss_mb(), self.counts)
+        return False
+
+
+def record(name, start, wall, cpu, rss_before, rss_after, counts):
+    with _lock:
+        entry = _stages.setdefault(name, {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0,
+                                          'peak_rss_mb': None, 'rss_growth_mb': 0.0, 'counts': {}})
+        entry['calls'] += 1
+        entry['wall_seconds'] += wall
+        entry['cpu_seconds'] += cpu
+        if rss_after is not None:
+            entry['peak_rss_mb'] = max(entry['peak_rss_mb'] or 0, rss_after)
+            entry['rss_growth_mb'] += rss_after - rss_before
+        for key, value in counts.items():
+            entry['counts'][key] = entry['counts'].get(key, 0) + value
+        _events.append({'name': name, 'cat': 'stage', 'ph': 'X', 'pid': os.getpid(),
+                        'tid': threading.get_ident(), 'ts': (start - _origin) * 1e6, 'dur': wall * 1e6,
+                        'args': dict(counts, cpu_seconds=cpu)})
+
+
+def stage(name):
+    """Context manager timing one pipeline stage.
+
+    Yields a dict for row/edge counts of the stage (summed over calls).
+    When PIPELINE_PROFILE is not set this returns a shared no-op context.
+    """
+    return _DISABLED if _report_path is None else _Stage(name)
+
+
+def instrumented(name, counts=None):
+    """Decorator recording every call of a function as stage `name`.
+
+    `counts(result)` returns the row/edge counts of a call. The function is
+    returned unchanged when PIPELINE_PROFILE is not set at import time.
+    """
+    def decorate(function):
+        if _report_path is None:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name) as stage_counts:
+                result = function(*args, **kwargs)
+                if counts is not None:
+                    stage_counts.update(counts(result))
+            return result
+        return wrapper
+    return decorate
+
+
+def report():
+    """Per-stage totals plus trace events of every call, loadable in chrome://tracing or Perfetto."""
+    with _lock:
+        return {'stages': json.loads(json.dumps(_stages)), 'peak_rss_mb': peak_rss_mb(),
+                'traceEvents': list(_events), 'displayTimeUnit': 'ms'}
+
+
+def write_report(path=None):
+    path = Path(path or _report_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = report()
+    profiles = {}
+    for name, profiler in _profilers.items():
+        profile_path = path.with_name(f'{path.stem}-{name}.prof')
+        profiler.dump_stats(profile_path)
+        profiles[name] = str(profile_path)
+    data['profiles'] = profiles
+    path.write_text(json.dumps(data, indent=2))
+    return path
+
+
+if _report_path is not None:
+    atexit.register(write_report)
@@ -0,0 +1,146 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+import shapely
+from pyproj import Transformer
+from scipy import sparse
+
+from data_store import SNAPSHOT_DIR
+from effect_model import EDGE_ATTRIBUTES
+from instrument import instrumented
+from road_network import chain_lines, edge_chains
+
+# Equal-area projected CRS (California Albers, meters) used for clipped lengths and areas
+OVERLAY_CRS = 'EPSG:3310'
+
+
+def project_nodes(network, crs=OVERLAY_CRS):
+    # Node coordinates of a RoadNetwork in `crs`
+    transformer = Transformer.from_crs(network.crs, crs, always_xy=True)
+    return np.column_stack(transformer.transform(network.node_xy[:, 0], network.node_xy[:, 1]))
+
+
+def project_edges(network, crs=OVERLAY_CRS):
+    # Edge segments of a RoadNetwork as LineStrings in `crs`
+    node_xy = project_nodes(network, crs)
+    return shapely.linestrings(np.stack([node_xy[network.u], node_xy[network.v]], axis=1))
+
+
+@instrumented('build_overlay', lambda matrix: {'edge_polygon_pairs': matrix.nnz})
+def build_overlay(network, gdf):
+    """Sparse edge x neighborhood matrix of freeway length (meters) inside each polygon.
+
+    Columns follow the row order of `gdf`. Segments that only touch a polygon
+    at a point get no weight. The polygons are queried with the degree-2
+    chains of the network rather than its segments: every segment of a chain
+    lying inside a polygon counts in full, and only chains crossing a
+    polygon boundary are clipped segment by segment.
+    """
+    polygons = np.asarray(shapely.make_valid(np.asarray(gdf.geometry.to_crs(OVERLAY_CRS).values)))
+    shapely.prepare(polygons)
+    node_xy = project_nodes(network)
+    lines = shapely.linestrings(np.stack([node_xy[network.u], node_xy[network.v]], axis=1))
+    chain = edge_chains(network)
+    chains = chain_lines(network, chain, node_xy)
+    chain_idx, poly_idx = shapely.STRtree(polygons).query(chains, predicate='intersects')
+    inside = shapely.covered_by(chains[chain_idx], polygons[poly_idx])
+
+    # Expand every chain-polygon pair to the segments of the chain
+    members = np.argsort(chain, kind='stable')
+    size = np.bincount(chain, minlength=len(chains))
+    start = np.cumsum(size) - size
+    pair = np.repeat(np.arange(len(chain_idx)), size[chain_idx])
+    offset = np.arange(len(pair)) - np.repeat(np.cumsum(size[chain_idx]) - size[chain_idx], size[chain_idx])
+    edge_idx, poly_idx = members[start[chain_idx][pair] + offset], poly_idx[pair]
+
+    length = np.where(inside[pair], shapely.length(lines[edge_idx]), 0)
+    crossing = np.flatnonzero(~inside[pair])
+    crossing = crossing[shapely.intersects(lines[edge_idx[crossing]], polygons[poly_idx[crossing]])]
+    length[crossing] = shapely.length(shapely.intersection(lines[edge_idx[crossing]], polygons[poly_idx[crossing]]))
+    keep = length > 0
+    return sparse.csr_matrix((length[keep], (edge_idx[keep], poly_idx[keep])),
+                             shape=(network.n_edges, len(polygons)))
+
+
+def overlay_key(network, gdf):
+    digest = hashlib.sha256()
+    for array in [network.node_xy, network.u, network.v]:
+        digest.update(np.ascontiguousarray(array).tobytes())
+    digest.update(b''.join(shapely.to_wkb(np.asarray(gdf.geometry.values))))
+    return digest.hexdigest()[:16]
+
+
+@instrumented('load_overlay')
+def load_overlay(network, gdf):
+    """build_overlay cached under data/snapshots, keyed by the network and polygon geometry."""
+    path = SNAPSHOT_DIR / f'overlay-{overlay_key(network, gdf)}.npz'
+    if path.exists():
+        return sparse.load_npz(path).tocsr()
+
+    matrix = build_overlay(network, gdf)
+    SNAPSHOT_DIR.mkdir(exist_ok=True)
+    for stale in SNAPSHOT_DIR.glob('overlay-*.npz'):
+        if stale != path:
+            stale.unlink(missing_ok=True)
+    # A temporary file per process, outside the glob above, so concurrent writers never touch each other's
+    partial = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    with open(partial, 'wb') as file:
+        sparse.save_npz(file, matrix)
+    try:
+        partial.replace(path)
+    except OSError:
+        # Another process wrote the same snapshot first, and it may hold it open
+        partial.unlink(missing_ok=True)
+        if not path.exists():
+            raise
+    return matrix
+
+
+@instrumented('aggregate_weighted', lambda result: {'edges': len(result[0])})
+def aggregate_weighted(matrix, gdf, columns=EDGE_ATTRIBUTES):
+    """Length-weighted neighborhood attributes of every edge with freeway length inside a polygon.
+
+    Returns the covered edges and a dict of per-edge means. Missing
+    neighborhood values are left out of both the weighted sum and the
+    weights.
+    """
+    covered = np.flatnonzero(np.diff(matrix.indptr))
+    weights = matrix[covered]
+    attributes = {}
+    for column in columns:
+        values = gdf[column].to_numpy(dtype=float)
+        valid = ~np.isnan(values)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = (weights @ np.where(valid, values, 0)) / (weights @ valid.astype(float))
+        # A weighted mean of equal values can land one ulp off (11.999999999999998 for 12),
+        # which would flip the 12 µg/m³ comparisons, so the rounding noise is removed
+        attributes[column] = mean.round(9)
+    return covered, attributes
+
+
+def aggregate_pieces(matrix, gdf, chain, columns=EDGE_ATTRIBUTES):
+    """aggregate_weighted evaluated once per chain piece instead of once per edge.
+
+    Covered edges of the same degree-2 chain (`chain` from
+    road_network.edge_chains) that lie in one and the same neighborhood
+    form a piece, as their attributes are that neighborhood's values; every
+    other covered edge is a piece of its own. Returns the covered edges,
+    the piece of each of them and the per-piece means, so per-edge results
+    are `result[piece]`, the same as aggregating every edge.
+    """
+    covered = np.flatnonzero(np.diff(matrix.indptr))
+    single = np.diff(matrix.indptr)[covered] == 1
+    key = np.where(single, chain[covered] * matrix.shape[1] + matrix.indices[matrix.indptr[covered]], -1 - covered)
+    _, first, piece = np.unique(key, return_index=True, return_inverse=True)
+    _, attributes = aggregate_weighted(matrix[covered[first]], gdf, columns)
+    return covered, piece, attributes
+
+
+def neighborhood_freeways(matrix, gdf):
+    """Freeway kilometers and density (km per km²) of every neighborhood."""
+    freeway_km = np.asarray(matrix.sum(axis=0)).ravel() / 1000
+    area_km2 = gdf.geometry.to_crs(OVERLAY_CRS).area.to_numpy() / 1e6
+    return pd.DataFrame({'name': gdf['name'].to_numpy(), 'Freeway km': freeway_km,
+                         'Freeway Density': freeway_km / area_km2}, index=gdf.index)
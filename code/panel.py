@@ -0,0 +1,143 @@
+import argparse
+import glob
+import json
+import re
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from data_store import DATA_DIR, GEOJSON_NAME, source_path
+from effect_model import EDGE_ATTRIBUTES
+from indicators import INDICATOR_FILES, add_population_density, convert_indicators, load_indicators
+from scenarios import CHUNK_ELEMENTS, coefficient_matrix
+
+YEAR_SUFFIX = re.compile(r' - \d{4}$')
+
+
+def indicator_year_files(files=INDICATOR_FILES, data_dir=DATA_DIR):
+    """Every yearly file of each indicator, as rounds of column -> file name dicts.
+
+    'Average Household Size - 2022.xlsx' also brings in the 2021 file next
+    to it. Round i holds the i-th file of each indicator that has one, so
+    every round can go through load_indicators.
+    """
+    rounds = []
+    for column, name in files.items():
+        path = Path(name)
+        prefix = YEAR_SUFFIX.sub('', path.stem)
+        found = sorted(data_dir.glob(f'{glob.escape(prefix)} - *{path.suffix}')) if prefix != path.stem else []
+        for position, year_path in enumerate(found or [data_dir / name]):
+            if position == len(rounds):
+                rounds.append({})
+            rounds[position][column] = year_path.name
+    return rounds
+
+
+def build_panel(files=INDICATOR_FILES, data_dir=DATA_DIR):
+    """Neighborhoods x years x indicators panel of every yearly indicator file.
+
+    Returns a dict with a float32 'values' array of shape (names, years,
+    columns) and the 'names', 'years' and 'columns' indexes along its axes.
+    Each year goes through the same conversions as merged_data_converted.csv,
+    and indicators without a file for a year are NaN there.
+    """
+    series = {}
+    for round_files in indicator_year_files(files, data_dir):
+        for column, frame in load_indicators(round_files, data_dir).items():
+            frame = frame.drop_duplicates(['name', 'year']).set_index(['name', 'year'])
+            series.setdefault(column, []).append(frame[column])
+    long = pd.DataFrame({column: pd.concat(series[column]) for column in files})
+
+    geo_df = gpd.read_file(source_path(GEOJSON_NAME))
+    names = pd.Index(long.index.get_level_values('name').unique(), name='name')
+    years = pd.Index(sorted(long.index.get_level_values('year').unique()), name='year')
+    yearly = []
+    for year in years:
+        frame = long.xs(year, level='year').reindex(names).reset_index()
+        yearly.append(add_population_density(convert_indicators(frame), geo_df).drop(columns='name'))
+    columns = pd.Index(yearly[0].columns)
+    values = np.stack([frame.to_numpy(dtype=np.float32) for frame in yearly], axis=1)
+    return {'values': values, 'names': names, 'years': years, 'columns': columns}
+
+
+def year_values(panel, year):
+    # (names, columns) view of one year; basic indexing, so no data is copied
+    return panel['values'][:, panel['years'].get_loc(year), :]
+
+
+def neighborhood_values(panel, name):
+    # (years, columns) view of one neighborhood
+    return panel['values'][panel['names'].get_loc(name)]
+
+
+def year_frame(panel, year):
+    """DataFrame of one year over the panel's memory, indexed by name."""
+    return pd.DataFrame(year_values(panel, year), index=panel['names'], columns=panel['columns'], copy=False)
+
+
+def filled_values(panel):
+    # Every indicator carried forward to later years, and back to the years before its first value
+    values = panel['values']
+    observed = ~np.isnan(values)
+    years = np.arange(values.shape[1])[None, :, None]
+    last = np.maximum.accumulate(np.where(observed, years, -1), axis=1)
+    first = np.where(observed.any(axis=1, keepdims=True), np.argmax(observed, axis=1)[:, None, :], 0)
+    source = np.where(last >= 0, last, first)
+    return np.take_along_axis(values, source, axis=1)
+
+
+def project_trajectories(panel, scenarios, horizon=10, base_year=None, chunk_elements=CHUNK_ELEMENTS):
+    """PM2.5 trajectories of every neighborhood under every scenario, in one broadcast per block of scenarios.
+
+    `scenarios` are dicts overriding effect_model.COEFFICIENTS, as for
+    scenarios.coefficient_matrix. Starting from the PM2.5 of `base_year`
+    (default: the last year with PM2.5 data), each of the `horizon` years
+    applies the effect model with that year's income, density and transit
+    share, carried forward from the latest panel year. As with
+    simulate_effects, PM2.5 cannot fall below 0 and a missing effect
+    clamps it there. Returns a float32 array of shape (scenarios, names,
+    horizon + 1) and the trajectory years.
+    """
+    pm25_column, income_column, density_column, transit_column = (panel['columns'].get_loc(column)
+                                                                   for column in EDGE_ATTRIBUTES)
+    if base_year is None:
+        base_year = panel['years'][~np.isnan(panel['values'][:, :, pm25_column]).all(axis=0)].max()
+    years = base_year + np.arange(horizon + 1)
+    filled = filled_values(panel)
+    # Panel year in effect for each projected year
+    source = np.maximum(np.searchsorted(panel['years'], years[1:], side='right') - 1, 0)
+    inputs = filled[:, source, :]
+    income_mod = np.log1p(inputs[..., income_column] / 100000)
+    density_mod = np.log1p(inputs[..., density_column] / 1000)
+    transit = inputs[..., transit_column]
+    pm25 = filled[:, panel['years'].get_loc(base_year), pm25_column]
+
+    coefficients = coefficient_matrix(scenarios).astype(np.float32)
+    trajectories = np.empty((len(coefficients), len(pm25), horizon + 1), dtype=np.float32)
+    trajectories[:, :, 0] = pm25
+    block = max(1, chunk_elements // max(income_mod.size, 1))
+    for start in range(0, len(coefficients), block):
+        transit_c, ev_c, active_c, drive_c, commute_c, threshold = (
+            coefficients[start:start + block, i, None, None] for i in range(6))
+        total_effect = ((transit_c + ev_c + drive_c) * income_mod + active_c * density_mod
+                        + commute_c * np.where(transit > threshold, density_mod, 0))
+        # Clamping each year's factor at 0 is the same as clamping the PM2.5 after every step
+        factor = np.where(1 + total_effect > 0, 1 + total_effect, 0)
+        trajectories[start:start + block, :, 1:] = pm25[:, None] * np.cumprod(factor, axis=2)
+    return trajectories, years
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Project neighborhood PM2.5 trajectories under policy scenarios.')
+    parser.add_argument('--horizon', type=int, default=10, help='years to project')
+    parser.add_argument('--scenarios', default=None,
+                        help='JSON file with a list of coefficient overrides (default: the baseline coefficients)')
+    args = parser.parse_args()
+
+    panel = build_panel()
+    scenarios = json.loads(Path(args.scenarios).read_text()) if args.scenarios else [{}]
+    trajectories, years = project_trajectories(panel, scenarios, args.horizon)
+    print(f"Panel of {len(panel['names'])} neighborhoods x {list(panel['years'])} x {len(panel['columns'])} indicators")
+    print(pd.DataFrame(np.nanmean(trajectories, axis=1), columns=years).rename_axis('scenario'))
@@ -0,0 +1,107 @@
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from scenarios import COEFFICIENT_NAMES, coefficient_matrix, evaluate_scenarios, mean_effects, prepare_edges
+
+# Edge arrays written to the memory-mapped file shared by the workers
+SHARED_ARRAYS = ['pm25', 'income_mod', 'density_mod', 'transit', 'weight']
+
+_edges = None
+
+
+def sample_coefficients(rng, n, relative_sd=0.2):
+    """Draw n coefficient vectors around the defaults with a relative normal spread."""
+    defaults = coefficient_matrix([{}])
+    return defaults * rng.normal(1, relative_sd, size=(n, len(COEFFICIENT_NAMES)))
+
+
+def batch_moments(values):
+    # count, mean, sum of squared deviations, min and max of every metric in a batch
+    return {column: (len(column_values), column_values.mean(), ((column_values - column_values.mean()) ** 2).sum(),
+                     column_values.min(), column_values.max())
+            for column, column_values in values.items()}
+
+
+def merge_moments(a, b):
+    # Chan et al. pairwise update, so batches can be folded in as they arrive
+    n_a, mean_a, m2_a, min_a, max_a = a
+    n_b, mean_b, m2_b, min_b, max_b = b
+    n = n_a + n_b
+    delta = mean_b - mean_a
+    return n, mean_a + delta * n_b / n, m2_a + m2_b + delta ** 2 * n_a * n_b / n, min(min_a, min_b), max(max_a, max_b)
+
+
+def _attach(path, scalars):
+    global _edges
+    block = np.load(path, mmap_mode='r')
+    _edges = dict(zip(SHARED_ARRAYS, block), **scalars)
+
+
+def _detach():
+    global _edges
+    _edges = None
+
+
+def _run_batch(seed, n, sampler):
+    coefficients = sampler(np.random.default_rng(seed), n)
+    values = {**mean_effects(coefficients, _edges), **evaluate_scenarios(coefficients, _edges)}
+    return batch_moments(values)
+
+
+def ordered_results(pool, window, seeds, sizes, sampler):
+    # Keep at most `window` batches in flight and yield their results in batch order
+    in_flight = deque()
+    for seed, size in zip(seeds, sizes):
+        in_flight.append(pool.submit(_run_batch, seed, size, sampler))
+        if len(in_flight) >= window:
+            yield in_flight.popleft().result()
+    while in_flight:
+        yield in_flight.popleft().result()
+
+
+def fold_batches(batches):
+    totals = None
+    for moments in batches:
+        totals = moments if totals is None else {column: merge_moments(totals[column], moments[column])
+                                                 for column in totals}
+    return totals
+
+
+def monte_carlo(attributes, n_scenarios, seed=0, sampler=sample_coefficients, batch_size=1000, workers=None):
+    """Run n_scenarios sampled coefficient vectors across a process pool.
+
+    The per-edge arrays are written once to a memory-mapped file that every
+    worker maps read-only. Batch i always draws from the i-th child of
+    SeedSequence(seed), so results do not depend on the number of workers, and
+    per-batch moments are merged in batch order as they arrive, so memory does
+    not grow with n_scenarios. `sampler(rng, n)` must be a module-level
+    function returning an (n, 6) coefficient matrix.
+
+    Returns count, mean, std, min and max of each scenario summary metric.
+    """
+    edges = prepare_edges(attributes)
+    scalars = {'income_mean': edges['income_mean'], 'density_mean': edges['density_mean']}
+    sizes = [min(batch_size, n_scenarios - start) for start in range(0, n_scenarios, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'edges.npy'
+        np.save(path, np.stack([edges[name] for name in SHARED_ARRAYS]))
+        if workers == 1:
+            _attach(path, scalars)
+            totals = fold_batches(map(_run_batch, seeds, sizes, [sampler] * len(sizes)))
+            _detach()
+        else:
+            workers = workers or os.cpu_count()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=(path, scalars)) as pool:
+                totals = fold_batches(ordered_results(pool, 4 * workers, seeds, sizes, sampler))
+
+    stats = pd.DataFrame(totals, index=['count', 'mean', 'm2', 'min', 'max']).T
+    stats['std'] = np.sqrt(stats['m2'] / (stats['count'] - 1).clip(lower=1))
+    return stats[['count', 'mean', 'std', 'min', 'max']]
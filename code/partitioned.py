@@ -0,0 +1,146 @@
+import argparse
+import math
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyogrio
+from pyproj import Transformer
+
+from data_store import SNAPSHOT_DIR, load_neighborhoods
+from effect_model import EDGE_ATTRIBUTES, EFFECT_COLUMNS, simulate_effects
+from exposure_rules import exposure_masks
+from overlay import OVERLAY_CRS, aggregate_weighted, build_overlay
+from road_network import RoadNetwork, build_road_network
+from roadway_reader import ROADWAY_PATH, read_roadways
+
+# Tile edge in the neighborhoods' CRS units (degrees for the county GeoJSON files)
+TILE_SIZE = 0.25
+OUTPUT_DIR = SNAPSHOT_DIR / 'partitioned'
+
+
+def grid_partitions(bounds, tile_size=TILE_SIZE):
+    """Half-open (xmin, ymin, xmax, ymax) tiles covering `bounds`, row by row."""
+    nx = math.floor((bounds[2] - bounds[0]) / tile_size) + 1
+    ny = math.floor((bounds[3] - bounds[1]) / tile_size) + 1
+    return [(bounds[0] + i * tile_size, bounds[1] + j * tile_size,
+             bounds[0] + (i + 1) * tile_size, bounds[1] + (j + 1) * tile_size)
+            for j in range(ny) for i in range(nx)]
+
+
+def owned_edges(network, tile):
+    # Each segment belongs to the one tile containing its midpoint
+    midpoint = network.edge_coords.mean(axis=1)
+    return ((midpoint[:, 0] >= tile[0]) & (midpoint[:, 0] < tile[2]) &
+            (midpoint[:, 1] >= tile[1]) & (midpoint[:, 1] < tile[3]))
+
+
+def process_partition(tile, roads_path, polygons_path, crs):
+    """Simulate the road segments owned by one tile.
+
+    Only roads crossing the tile are read. The polygons are read for the
+    extent of the owned segments, which is the halo: segments crossing the
+    tile boundary still see every neighborhood they run through, while
+    each segment is simulated by exactly one partition. Returns the per-edge
+    results and the freeway meters the owned segments put in each
+    neighborhood (by global row position).
+    """
+    roads = read_roadways(roads_path, crs=crs, bbox=tile)
+    if len(roads) == 0:
+        return None
+    network = build_road_network(roads)
+    keep = owned_edges(network, tile)
+    if not keep.any():
+        return None
+    network = RoadNetwork(node_xy=network.node_xy, u=network.u[keep], v=network.v[keep],
+                          length=network.length[keep], source=network.source[keep], crs=network.crs)
+    coords = network.edge_coords
+    extent = (coords[..., 0].min(), coords[..., 1].min(), coords[..., 0].max(), coords[..., 1].max())
+    polygons = gpd.read_parquet(polygons_path, bbox=extent)
+    if len(polygons) == 0:
+        return None
+
+    overlay = build_overlay(network, polygons)
+    covered, attributes = aggregate_weighted(overlay, polygons)
+    result = simulate_effects(*[attributes[column] for column in EDGE_ATTRIBUTES])
+    edges = pd.DataFrame({'x0': coords[covered, 0, 0], 'y0': coords[covered, 0, 1],
+                          'x1': coords[covered, 1, 0], 'y1': coords[covered, 1, 1],
+                          **{column: result[column] for column in EFFECT_COLUMNS + ['pm25_reduction', 'color_class']}})
+    meters = np.asarray(overlay.sum(axis=0)).ravel()
+    return edges, polygons['_row'].to_numpy(), meters
+
+
+def run_partitioned(gdf, roads_path=ROADWAY_PATH, tile_size=TILE_SIZE, workers=None):
+    """simulate_changes and the exposure classification over any number of counties.
+
+    Road segments and neighborhoods are split into grid tiles, processed in
+    parallel worker processes (in-process for workers=1), and merged. A
+    worker only holds the roads crossing its tile and the polygons under its
+    segments, so memory is bounded by the tile size rather than the state.
+
+    Returns (edges, neighborhoods): one row per simulated segment with its
+    endpoints and effect model outputs, and one row per neighborhood with
+    its freeway km, freeway density and high/low exposure flags.
+    """
+    info = pyogrio.read_info(roads_path)
+    road_bounds = Transformer.from_crs(info['crs'], gdf.crs, always_xy=True).transform_bounds(*info['total_bounds'])
+    bounds = np.concatenate([np.minimum(gdf.total_bounds[:2], road_bounds[:2]),
+                             np.maximum(gdf.total_bounds[2:], road_bounds[2:])])
+    tiles = grid_partitions(bounds, tile_size)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Partitions read only their own polygons through the bbox covering column
+        polygons_path = Path(tmp) / 'neighborhoods.parquet'
+        columns = ['name'] + EDGE_ATTRIBUTES
+        polygons = gpd.GeoDataFrame(gdf[columns].assign(_row=np.arange(len(gdf))), geometry=gdf.geometry.values,
+                                    crs=gdf.crs)
+        polygons.to_parquet(polygons_path, write_covering_bbox=True)
+        args = [(tile, roads_path, polygons_path, gdf.crs) for tile in tiles]
+        if workers == 1:
+            results = [process_partition(*arg) for arg in args]
+        else:
+            with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+                results = list(pool.map(process_partition, *zip(*args)))
+
+    results = [result for result in results if result is not None]
+    edges = pd.concat([edges for edges, _, _ in results], ignore_index=True) if results else pd.DataFrame()
+    meters = np.zeros(len(gdf))
+    for _, rows, partition_meters in results:
+        np.add.at(meters, rows, partition_meters)
+
+    area_km2 = gdf.geometry.to_crs(OVERLAY_CRS).area.to_numpy() / 1e6
+    exposure = exposure_masks(gdf)
+    neighborhoods = pd.DataFrame({'name': gdf['name'].to_numpy(), 'Freeway km': meters / 1000,
+                                  'Freeway Density': meters / 1000 / area_km2,
+                                  'High Exposure': exposure['high'], 'Low Exposure': exposure['low']},
+                                 index=gdf.index)
+    return edges, neighborhoods
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the simulation over spatial partitions in parallel.')
+    parser.add_argument('--roads', default=str(ROADWAY_PATH), help='road layer readable by GDAL')
+    parser.add_argument('--neighborhoods', default=None,
+                        help='GeoParquet/Feather neighborhoods with the model columns (default: the LA dataset)')
+    parser.add_argument('--tile-size', type=float, default=TILE_SIZE, help='tile edge in the neighborhoods CRS units')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--output', default=str(OUTPUT_DIR), help='directory for edges.feather and neighborhoods.csv')
+    args = parser.parse_args()
+
+    if args.neighborhoods is None:
+        gdf = load_neighborhoods()
+    elif args.neighborhoods.endswith('.feather'):
+        gdf = gpd.read_feather(args.neighborhoods)
+    else:
+        gdf = gpd.read_parquet(args.neighborhoods)
+    edges, neighborhoods = run_partitioned(gdf, args.roads, args.tile_size, args.jobs)
+
+    output = Path(args.output)
+    output.mkdir(parents=True, exist_ok=True)
+    edges.to_feather(output / 'edges.feather')
+    neighborhoods.to_csv(output / 'neighborhoods.csv', index=False)
+    print(f'{len(edges)} edges and {len(neighborhoods)} neighborhoods written to {output}')
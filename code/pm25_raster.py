@@ -0,0 +1,154 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+import shapely
+from scipy.signal import fftconvolve
+
+from data_store import SNAPSHOT_DIR
+from overlay import OVERLAY_CRS, project_nodes
+
+# Raster cell edge in meters (OVERLAY_CRS)
+CELL_SIZE = 50
+# Dispersion kernels: value at distance d (m) for a length scale s, truncated at KERNEL_EXTENT * s
+KERNELS = {
+    'exponential': lambda d, s: np.exp(-d / s),
+    'gaussian': lambda d, s: np.exp(-0.5 * (d / s) ** 2),
+}
+KERNEL_SCALE = 500
+KERNEL_EXTENT = 5
+
+
+def grid_spec(bounds, cell_size=CELL_SIZE):
+    """Raster covering `bounds` (OVERLAY_CRS); row 0 is the southern edge."""
+    shape = (int(np.ceil((bounds[3] - bounds[1]) / cell_size)), int(np.ceil((bounds[2] - bounds[0]) / cell_size)))
+    return {'xmin': bounds[0], 'ymin': bounds[1], 'cell_size': cell_size, 'shape': shape}
+
+
+def cell_index(grid, x, y):
+    # Flat cell index of each point, -1 outside the raster
+    row = np.floor((y - grid['ymin']) / grid['cell_size']).astype(int)
+    col = np.floor((x - grid['xmin']) / grid['cell_size']).astype(int)
+    inside = (row >= 0) & (row < grid['shape'][0]) & (col >= 0) & (col < grid['shape'][1])
+    return np.where(inside, row * grid['shape'][1] + col, -1)
+
+
+def burn_edges(grid, network, edges, values):
+    """Raster of `values` per unit length along the given network edges.
+
+    Every edge is split into pieces no longer than half a cell, and each
+    piece adds value * piece length / cell size to the cell holding its
+    midpoint, so a cell crossed once by a road of value v holds about v.
+    Missing values burn nothing.
+    """
+    node_xy = project_nodes(network)
+    start, end = node_xy[network.u[edges]], node_xy[network.v[edges]]
+    length = np.hypot(*(end - start).T)
+    pieces = np.maximum(np.ceil(2 * length / grid['cell_size']), 1).astype(int)
+    edge = np.repeat(np.arange(len(edges)), pieces)
+    fraction = (np.arange(len(edge)) - np.repeat(np.cumsum(pieces) - pieces, pieces) + 0.5) / pieces[edge]
+    midpoint = start[edge] + fraction[:, None] * (end - start)[edge]
+    cells = cell_index(grid, midpoint[:, 0], midpoint[:, 1])
+    weight = (np.nan_to_num(np.asarray(values, dtype=float)) * length / pieces / grid['cell_size'])[edge]
+    keep = cells >= 0
+    burned = np.bincount(cells[keep], weight[keep], minlength=np.prod(grid['shape']))
+    return burned.reshape(grid['shape']).astype(np.float32)
+
+
+def kernel_radius(cell_size=CELL_SIZE, scale=KERNEL_SCALE, extent=KERNEL_EXTENT):
+    # Cells from the center of the dispersion kernel to its edge
+    return int(np.ceil(extent * scale / cell_size))
+
+
+def dispersion_kernel(cell_size=CELL_SIZE, kernel='exponential', scale=KERNEL_SCALE, extent=KERNEL_EXTENT):
+    # Square kernel normalized to unit sum, so dispersion moves values around without adding any
+    radius = kernel_radius(cell_size, scale, extent)
+    offset = np.arange(-radius, radius + 1) * cell_size
+    weights = KERNELS[kernel](np.hypot(*np.meshgrid(offset, offset)), scale)
+    return (weights / weights.sum()).astype(np.float32)
+
+
+def disperse(burned, cell_size=CELL_SIZE, kernel='exponential', scale=KERNEL_SCALE):
+    """Convolve a burned raster with a dispersion kernel through the FFT.
+
+    The result keeps the shape of `burned`, so whatever spreads past its
+    edge is dropped, and cells within the kernel radius of the edge miss
+    the spillover of roads beyond it; see dispersed_pm25 for the padding
+    that keeps the cells of interest exact.
+    """
+    return fftconvolve(burned, dispersion_kernel(cell_size, kernel, scale), mode='same')
+
+
+def label_raster(gdf, grid):
+    """Row position + 1 of the neighborhood holding each cell center, 0 outside all of them."""
+    polygons = np.asarray(shapely.make_valid(np.asarray(gdf.geometry.to_crs(OVERLAY_CRS).values)))
+    labels = np.zeros(grid['shape'], dtype=np.int32)
+    size = grid['cell_size']
+    for position, polygon in enumerate(polygons):
+        xmin, ymin, xmax, ymax = polygon.bounds
+        row0 = max(int((ymin - grid['ymin']) // size), 0)
+        row1 = min(int((ymax - grid['ymin']) // size) + 1, grid['shape'][0])
+        col0 = max(int((xmin - grid['xmin']) // size), 0)
+        col1 = min(int((xmax - grid['xmin']) // size) + 1, grid['shape'][1])
+        x, y = np.meshgrid(grid['xmin'] + (np.arange(col0, col1) + 0.5) * size,
+                           grid['ymin'] + (np.arange(row0, row1) + 0.5) * size)
+        # Where neighborhoods overlap, the later one takes the cell
+        labels[row0:row1, col0:col1][shapely.contains_xy(polygon, x, y)] = position + 1
+    return labels
+
+
+def load_label_raster(gdf, grid):
+    """label_raster cached under data/snapshots, keyed by the polygons and the grid."""
+    digest = hashlib.sha256(repr(sorted(grid.items())).encode())
+    digest.update(b''.join(shapely.to_wkb(np.asarray(gdf.geometry.values))))
+    path = SNAPSHOT_DIR / f'labels-{digest.hexdigest()[:16]}.npy'
+    if path.exists():
+        return np.load(path)
+    labels = label_raster(gdf, grid)
+    SNAPSHOT_DIR.mkdir(exist_ok=True)
+    partial = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    with open(partial, 'wb') as file:
+        np.save(file, labels)
+    try:
+        partial.replace(path)
+    except OSError:
+        # Another process cached the same labels first
+        partial.unlink(missing_ok=True)
+        if not path.exists():
+            raise
+    return labels
+
+
+def zonal_mean(raster, labels, n_zones):
+    # Mean raster value of every zone (label 1..n_zones) in one bincount
+    totals = np.bincount(labels.ravel(), raster.ravel(), minlength=n_zones + 1)[1:]
+    counts = np.bincount(labels.ravel(), minlength=n_zones + 1)[1:]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return totals / counts
+
+
+def dispersed_pm25(network, simulated, gdf, cell_size=CELL_SIZE, kernel='exponential', scale=KERNEL_SCALE):
+    """Spillover-aware neighborhood PM2.5 after the simulated changes.
+
+    The per-edge PM2.5 reductions of simulate_changes (`simulated`) are
+    burned into a raster, spread with the dispersion kernel and averaged
+    over each neighborhood, so a neighborhood also benefits from changes
+    on nearby freeways it does not touch. The roads are burned into a
+    raster padded by the kernel radius around the neighborhoods, so
+    freeways just outside them still spread into them, and the surface is
+    cropped back afterwards. Returns the dispersed reduction and the
+    neighborhood PM2.5 minus it, plus the reduction raster and its grid.
+    """
+    bounds = shapely.total_bounds(np.asarray(gdf.geometry.to_crs(OVERLAY_CRS).values))
+    grid = grid_spec(bounds, cell_size)
+    pad = kernel_radius(cell_size, scale)
+    rows, cols = grid['shape']
+    padded = dict(grid, xmin=grid['xmin'] - pad * cell_size, ymin=grid['ymin'] - pad * cell_size,
+                  shape=(rows + 2 * pad, cols + 2 * pad))
+    burned = burn_edges(padded, network, simulated['edge'], simulated['pm25_reduction'])
+    surface = disperse(burned, cell_size, kernel, scale)[pad:pad + rows, pad:pad + cols]
+    reduction = zonal_mean(surface, load_label_raster(gdf, grid), len(gdf))
+    result = pd.DataFrame({'name': gdf['name'].to_numpy(), 'Dispersed Reduction': reduction,
+                           'Dispersed PM2.5': gdf['PM2.5 Concentration'].to_numpy() - reduction}, index=gdf.index)
+    return result, surface, grid
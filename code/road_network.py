@@ -0,0 +1,103 @@
+from dataclasses import dataclass
+
+import networkx as nx
+import numpy as np
+import shapely
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+from instrument import instrumented
+
+
+@dataclass
+class RoadNetwork:
+    """Road network stored as an edge table.
+
+    Every edge is one segment between consecutive vertices of a roadway line.
+    `u` and `v` index rows of `node_xy`, `length` is the segment length in CRS
+    units and `source` is the position of the roadway row the segment came from.
+    """
+    node_xy: np.ndarray
+    u: np.ndarray
+    v: np.ndarray
+    length: np.ndarray
+    source: np.ndarray
+    crs: object = None
+
+    @property
+    def n_edges(self):
+        return len(self.u)
+
+    @property
+    def edge_coords(self):
+        # (E, 2, 2) array of segment endpoints
+        return np.stack([self.node_xy[self.u], self.node_xy[self.v]], axis=1)
+
+    def to_networkx(self):
+        # NetworkX view keyed by coordinate tuples, as the scripts used to build it
+        G = nx.Graph(crs=self.crs)
+        nodes = list(map(tuple, self.node_xy.tolist()))
+        G.add_edges_from(
+            (nodes[a], nodes[b], {'length': length, 'edge_id': i})
+            for i, (a, b, length) in enumerate(zip(self.u.tolist(), self.v.tolist(), self.length.tolist())))
+        return G
+
+
+@instrumented('build_road_network', lambda network: {'edges': network.n_edges, 'nodes': len(network.node_xy)})
+def build_road_network(roadways):
+    """Build a RoadNetwork from a GeoDataFrame of LineString/MultiLineString roads.
+
+    Coordinates are extracted for all lines at once, vertices with identical
+    coordinates become one node, and repeated segments (in either direction)
+    are kept once, like edges added to an undirected nx.Graph.
+    """
+    # Explode MultiLineStrings into their parts and keep the line geometries
+    parts, part_source = shapely.get_parts(roadways.geometry.values, return_index=True)
+    is_line = np.isin(shapely.get_type_id(parts), [1, 2])
+    parts, part_source = parts[is_line], part_source[is_line]
+
+    # Consecutive vertices of the same part form a segment
+    coords, part_idx = shapely.get_coordinates(parts, return_index=True)
+    same_part = part_idx[:-1] == part_idx[1:]
+    node_xy, node_id = np.unique(coords, axis=0, return_inverse=True)
+    node_id = node_id.ravel()
+    u, v = node_id[:-1][same_part], node_id[1:][same_part]
+    source = part_source[part_idx[:-1][same_part]]
+
+    # Drop repeated undirected segments, keeping the first occurrence
+    pairs = np.stack([np.minimum(u, v), np.maximum(u, v)], axis=1)
+    _, first = np.unique(pairs, axis=0, return_index=True)
+    first.sort()
+    u, v, source = u[first], v[first], source[first]
+
+    delta = node_xy[v] - node_xy[u]
+    length = np.hypot(delta[:, 0], delta[:, 1])
+    return RoadNetwork(node_xy=node_xy, u=u, v=v, length=length, source=source, crs=roadways.crs)
+
+
+def edge_chains(network):
+    """Degree-2 chain of every edge, numbered from 0.
+
+    Edges meeting at a node with exactly two edges belong to the same chain,
+    so a chain runs between junctions or dead ends (or round a loop), which
+    is the topology of the roads without their shape vertices.
+    """
+    ends = np.concatenate([network.u, network.v])
+    edge = np.tile(np.arange(network.n_edges), 2)
+    through = np.bincount(ends, minlength=len(network.node_xy))[ends] == 2
+    # The two edge ends at each degree-2 node are adjacent after sorting by node
+    pairs = edge[through][np.argsort(ends[through], kind='stable')].reshape(-1, 2)
+    links = sparse.coo_matrix((np.ones(len(pairs)), (pairs[:, 0], pairs[:, 1])),
+                              shape=(network.n_edges, network.n_edges))
+    return connected_components(links, directed=False)[1]
+
+
+def chain_lines(network, chain, node_xy=None):
+    """One polyline per chain through every vertex of its edges, so its length is the chain's total length.
+
+    `node_xy` replaces the node coordinates, e.g. with projected ones.
+    """
+    node_xy = network.node_xy if node_xy is None else node_xy
+    order = np.argsort(chain, kind='stable')
+    segments = shapely.linestrings(np.stack([node_xy[network.u[order]], node_xy[network.v[order]]], axis=1))
+    return shapely.line_merge(shapely.multilinestrings(segments, indices=chain[order]))
@@ -0,0 +1,26 @@
+from matplotlib.collections import LineCollection
+
+from effect_model import COLOR_CLASSES
+from instrument import instrumented
+
+
+@instrumented('draw_edges', lambda collections: {'edges': sum(len(c.get_segments()) for c in collections)})
+def draw_edges(ax, edge_coords, color_class, colors=COLOR_CLASSES, linewidth=2, rasterized=False):
+    """Draw classified road edges as one LineCollection per color class.
+
+    `edge_coords` is an (E, 2, 2) array of segment endpoints and `color_class`
+    the per-edge index into `colors`. Cap/join styles and z-order follow the
+    defaults of ax.plot so the result looks like one Line2D per edge.
+    Set `rasterized` to embed the road layer as an image in vector outputs.
+    """
+    collections = []
+    for code, color in enumerate(colors):
+        segments = edge_coords[color_class == code]
+        if len(segments) == 0:
+            continue
+        collection = LineCollection(segments, colors=color, linewidths=linewidth, capstyle='projecting',
+                                    joinstyle='round', zorder=2, rasterized=rasterized)
+        ax.add_collection(collection)
+        collections.append(collection)
+    ax.autoscale_view()
+    return collections
@@ -1,16 +1,14 @@
 import geopandas as gpd
 import matplotlib.pyplot as plt
-import contextily as ctx
 from shapely.geometry import box
+from basemap_cache import add_cached_basemap
+from roadway_reader import read_roadways
 
 
 la_county_geojson = 'data/los-angeles-county.geojson'
 la_county = gpd.read_file(la_county_geojson)
 freeways_shapefile = 'data/roadway/los-angeles-county-freeways.shp'
-freeways = gpd.read_file(freeways_shapefile)
-
-
-freeways = freeways.to_crs(la_county.crs)
+freeways = read_roadways(freeways_shapefile, crs=la_county.crs)
 
 fig, ax = plt.subplots(figsize=(12, 12))  # Increase figure size
 
@@ -20,8 +18,8 @@ la_county.plot(ax=ax, color='none', edgecolor='black', label='LA County Border')
 # Plot the major freeways on top of the GeoJSON data
 freeways.plot(ax=ax, color='blue', linewidth=1, label='Major Freeways')
 
-# Add basemap from OpenStreetMap
-ctx.add_basemap(ax, crs=la_county.crs.to_string(), source=ctx.providers.OpenStreetMap.Mapnik)
+# Add basemap from OpenStreetMap, stitched from the local tile cache
+add_cached_basemap(ax, la_county.crs.to_string())
 
 # Mask the area outside the Los Angeles County and add grey overlay
 outside_county = box(ax.get_xlim()[0], ax.get_ylim()[0], ax.get_xlim()[1], ax.get_ylim()[1])
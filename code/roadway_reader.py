@@ -0,0 +1,60 @@
+import geopandas as gpd
+import numpy as np
+import pyogrio
+import shapely
+from pyproj import CRS, Transformer
+
+from data_store import DATA_DIR
+from instrument import instrumented
+
+ROADWAY_PATH = DATA_DIR / 'roadway' / 'los-angeles-county-freeways.shp'
+
+# Features per Arrow record batch when streaming
+BATCH_SIZE = 65536
+
+
+def layer_filter(path, crs=None, bbox=None, mask=None):
+    # CRS of the layer, and bbox/mask given in `crs` moved into it, which is where GDAL applies the filter
+    layer_crs = CRS.from_user_input(pyogrio.read_info(path)['crs'])
+    if crs is None or CRS.from_user_input(crs) == layer_crs:
+        return layer_crs, bbox, mask
+    transformer = Transformer.from_crs(crs, layer_crs, always_xy=True)
+    if bbox is not None:
+        bbox = transformer.transform_bounds(*bbox)
+    if mask is not None:
+        mask = shapely.transform(mask, lambda xy: np.column_stack(transformer.transform(xy[:, 0], xy[:, 1])))
+    return layer_crs, bbox, mask
+
+
+def batch_frame(batch, geometry_name, layer_crs, crs):
+    # GeoDataFrame of one Arrow record batch, reprojected to `crs`
+    geometry = shapely.from_wkb(batch.column(geometry_name).to_numpy(zero_copy_only=False))
+    attributes = batch.drop_columns([geometry_name]).to_pandas()
+    frame = gpd.GeoDataFrame(attributes, geometry=geometry, crs=layer_crs)
+    return frame if crs is None else frame.to_crs(crs)
+
+
+def iter_roadways(path=ROADWAY_PATH, columns=(), crs=None, bbox=None, mask=None, batch_size=BATCH_SIZE):
+    """Stream a road layer as GeoDataFrame chunks of at most `batch_size` features.
+
+    Only the geometry and the named attribute `columns` are read, through
+    GDAL's Arrow stream. `bbox` (xmin, ymin, xmax, ymax) or a shapely `mask`
+    polygon, both in `crs`, keep only the features intersecting them and are
+    applied while reading. Chunks are reprojected to `crs` when it is given.
+    """
+    layer_crs, bbox, mask = layer_filter(path, crs, bbox, mask)
+    with pyogrio.raw.open_arrow(path, columns=list(columns), bbox=bbox, mask=mask, batch_size=batch_size,
+                                use_pyarrow=True) as (meta, reader):
+        geometry_name = meta['geometry_name'] or 'wkb_geometry'
+        for batch in reader:
+            if batch.num_rows:
+                yield batch_frame(batch, geometry_name, layer_crs, crs)
+
+
+@instrumented('read_roadways', lambda roadways: {'road_lines': len(roadways)})
+def read_roadways(path=ROADWAY_PATH, columns=(), crs=None, bbox=None, mask=None):
+    """Whole road layer as one GeoDataFrame, with the same options as iter_roadways."""
+    layer_crs, bbox, mask = layer_filter(path, crs, bbox, mask)
+    roadways = pyogrio.read_dataframe(path, columns=list(columns), bbox=bbox, mask=mask, use_arrow=True)
+    roadways = roadways.set_crs(layer_crs, allow_override=True)
+    return roadways if crs is None else roadways.to_crs(crs)
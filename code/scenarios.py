@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+from effect_model import COEFFICIENTS, EDGE_ATTRIBUTES, PM25_THRESHOLD
+
+# Column order of a coefficient matrix
+COEFFICIENT_NAMES = list(COEFFICIENTS)
+
+# Upper bound on scenario x edge elements evaluated at once
+CHUNK_ELEMENTS = 1 << 22
+
+
+def coefficient_matrix(scenarios):
+    """(K, 6) coefficient matrix from K dicts overriding the default COEFFICIENTS."""
+    return np.array([[{**COEFFICIENTS, **scenario}[name] for name in COEFFICIENT_NAMES] for scenario in scenarios],
+                    dtype=float)
+
+
+def prepare_edges(attributes):
+    """Scenario-independent inputs of the effect model.
+
+    Edges touching the same neighborhoods share the same attributes, so the
+    edges are collapsed to their distinct attribute rows, each weighted by the
+    number of edges it stands for.
+    """
+    columns = np.column_stack([np.asarray(attributes[column], dtype=float) for column in EDGE_ATTRIBUTES])
+    rows, weight = np.unique(columns, axis=0, return_counts=True)
+    pm25, income, density, transit = rows.T
+    income_mod, density_mod = np.log1p(income / 100000), np.log1p(density / 1000)
+
+    # NaN-skipping edge means of the modifiers, as pandas' mean of the effect columns
+    income_valid, density_valid = ~np.isnan(income_mod), ~np.isnan(density_mod)
+    return {
+        'pm25': pm25,
+        'income_mod': income_mod,
+        'density_mod': density_mod,
+        'transit': transit,
+        'weight': weight.astype(float),
+        'income_mean': weight[income_valid] @ income_mod[income_valid] / weight[income_valid].sum(),
+        'density_mean': weight[density_valid] @ density_mod[density_valid] / weight[density_valid].sum(),
+    }
+
+
+def evaluate_scenarios(coefficients, edges):
+    """Summary arrays for a block of scenarios, evaluated as one (K, E) broadcast."""
+    transit_c, ev_c, active_c, drive_c, commute_c, threshold = (coefficients[:, [i]] for i in range(6))
+    pm25, income_mod, density_mod = edges['pm25'], edges['income_mod'], edges['density_mod']
+    weight = edges['weight']
+
+    total_effect = ((transit_c + ev_c + drive_c) * income_mod + active_c * density_mod
+                    + commute_c * np.where(edges['transit'] > threshold, density_mod, 0))
+    raw_pm25 = pm25 * (1 + total_effect)
+    simulated_pm25 = np.where(raw_pm25 > 0, raw_pm25, 0.0)
+
+    above_before = pm25 >= PM25_THRESHOLD
+    below_before = pm25 < PM25_THRESHOLD
+    reduction = np.nan_to_num(pm25 - simulated_pm25)
+    return {
+        'edges_improved': ((simulated_pm25 < PM25_THRESHOLD) & above_before) @ weight,
+        'edges_worsened': ((simulated_pm25 >= PM25_THRESHOLD) & below_before) @ weight,
+        'total_reduction': reduction @ weight,
+    }
+
+
+def mean_effects(coefficients, edges):
+    # The effect columns are linear in the coefficients, so their means are too
+    income_mean, density_mean = edges['income_mean'], edges['density_mean']
+    transit_c, ev_c, active_c, drive_c = (coefficients[:, i] for i in range(4))
+    return {
+        'income_effect': (transit_c + ev_c + drive_c) * income_mean,
+        'density_effect': active_c * density_mean,
+        'ev_effect': ev_c * income_mean,
+        'transit_effect': transit_c * income_mean,
+        'drive_effect': drive_c * income_mean,
+    }
+
+
+def sweep_scenarios(coefficients, attributes, chunk_elements=CHUNK_ELEMENTS):
+    """Evaluate K coefficient vectors against the same precomputed edge attributes.
+
+    `coefficients` is a (K, 6) matrix with columns COEFFICIENT_NAMES and
+    `attributes` the per-edge means from overlay.aggregate_weighted (or the
+    per-piece means of overlay.aggregate_pieces indexed by `piece`). Returns one
+    row per scenario with the mean of every effect column, the number of edges
+    moved below (improved) or above (worsened) 12 µg/m³, and the total PM2.5
+    reduction over all edges.
+    """
+    coefficients = np.atleast_2d(np.asarray(coefficients, dtype=float))
+    edges = prepare_edges(attributes)
+
+    # Scenarios are evaluated in blocks to bound the size of the (K, E) temporaries
+    block = max(1, chunk_elements // max(len(edges['pm25']), 1))
+    parts = [evaluate_scenarios(coefficients[start:start + block], edges)
+             for start in range(0, len(coefficients), block)]
+
+    summary = pd.DataFrame(coefficients, columns=COEFFICIENT_NAMES)
+    for column, values in mean_effects(coefficients, edges).items():
+        summary[column] = values
+    for column in ['edges_improved', 'edges_worsened']:
+        summary[column] = np.concatenate([part[column] for part in parts]).round().astype(int)
+    summary['total_reduction'] = np.concatenate([part['total_reduction'] for part in parts])
+    return summary
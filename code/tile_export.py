@@ -0,0 +1,175 @@
+import argparse
+import json
+import math
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from data_store import SNAPSHOT_DIR, load_neighborhoods
+from effect_model import COLOR_CLASSES, EDGE_ATTRIBUTES, simulate_effects
+from exposure_rules import ANALYSIS_COLUMNS, exposure_masks
+from geometry_lod import load_levels, select_level
+from overlay import aggregate_weighted, load_overlay
+from road_network import build_road_network
+from roadway_reader import read_roadways
+from tile_math import pixel_degrees, tile_bounds, tile_xy
+
+TILE_DIR = SNAPSHOT_DIR / 'tiles'
+ZOOMS = range(8, 14)
+# Below this zoom the edges of each color class are merged into simplified lines
+EDGE_DETAIL_ZOOM = 12
+# Extra margin clipped around every tile, as a fraction of its width, so strokes do not break at tile seams
+TILE_BUFFER = 1 / 64
+
+
+def coordinate_precision(zoom):
+    # Largest power of ten below an eighth of a pixel, so snapped coordinates print with few decimals
+    return 10.0 ** math.floor(math.log10(pixel_degrees(zoom) / 8))
+
+
+def json_records(properties):
+    # Feature properties as JSON objects, with missing values as null
+    records = properties.astype(object).where(properties.notna(), None).to_dict('records')
+    return [json.dumps(record, separators=(',', ':')) for record in records]
+
+
+def write_tiles(directory, geometries, records, zoom):
+    """Clip the features to every tile of one zoom level and write z/x/y.geojson files.
+
+    Returns the number of tiles written; tiles without features are skipped.
+    """
+    tree = shapely.STRtree(geometries)
+    xmin, ymin, xmax, ymax = shapely.total_bounds(geometries)
+    x0, y0 = tile_xy(xmin, ymax, zoom)
+    x1, y1 = tile_xy(xmax, ymin, zoom)
+    written = 0
+    for x in range(x0, x1 + 1):
+        for y in range(y0, y1 + 1):
+            west, south, east, north = tile_bounds(x, y, zoom)
+            margin = (east - west) * TILE_BUFFER
+            box = (west - margin, south - margin, east + margin, north + margin)
+            candidates = tree.query(shapely.box(*box))
+            # Coordinates snapped below an eighth of a pixel keep the files small without visible change
+            clipped = shapely.set_precision(shapely.clip_by_rect(geometries[candidates], *box),
+                                            coordinate_precision(zoom))
+            keep = ~shapely.is_empty(clipped)
+            if not keep.any():
+                continue
+            features = [f'{{"type":"Feature","geometry":{geometry},"properties":{records[index]}}}'
+                        for geometry, index in zip(shapely.to_geojson(clipped[keep]), candidates[keep])]
+            path = directory / str(zoom) / str(x) / f'{y}.geojson'
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text('{"type":"FeatureCollection","features":[' + ','.join(features) + ']}')
+            written += 1
+    return written
+
+
+def neighborhood_layer(gdf, columns):
+    # Choropleth attributes of the neighborhoods plus the shared exposure flags
+    exposure = exposure_masks(gdf)
+    properties = gdf[['name'] + columns].assign(high_exposure=exposure['high'], low_exposure=exposure['low'])
+    return json_records(properties)
+
+
+def merged_lines(coords, group, simplify=0):
+    # Segments of each group joined into the fewest lines; returns the lines and the group of each
+    codes, inverse = np.unique(group, return_inverse=True)
+    order = np.argsort(inverse, kind='stable')
+    merged = shapely.line_merge(shapely.multilinestrings(shapely.linestrings(coords[order]), indices=inverse[order]))
+    if simplify:
+        merged = shapely.simplify(merged, simplify)
+    return shapely.get_parts(merged), np.repeat(codes, shapely.get_num_geometries(merged))
+
+
+def edge_layer(network, simulated, zoom):
+    """Geometries and JSON properties of the simulated edges at one zoom level.
+
+    From EDGE_DETAIL_ZOOM on, connected edges with the same color class and
+    PM2.5 reduction are joined into one feature carrying the reduction; below
+    it the edges of each color class are joined and simplified to half a
+    pixel.
+    """
+    coords = network.edge_coords[simulated['edge']]
+    color_class = np.asarray(simulated['color_class'])
+    if zoom >= EDGE_DETAIL_ZOOM:
+        reduction = np.asarray(simulated['pm25_reduction'], dtype=float)
+        _, group = np.unique(np.column_stack([color_class, np.nan_to_num(reduction, nan=np.inf)]), axis=0,
+                             return_inverse=True)
+        geometries, parts = merged_lines(coords, group.ravel())
+        first = np.unique(group.ravel(), return_index=True)[1][parts]
+        properties = pd.DataFrame({'color_class': color_class[first], 'color': np.array(COLOR_CLASSES)[color_class[first]],
+                                   'pm25_reduction': reduction[first]})
+        return geometries, json_records(properties)
+    geometries, classes = merged_lines(coords, color_class, pixel_degrees(zoom) / 2)
+    properties = pd.DataFrame({'color_class': classes, 'color': np.array(COLOR_CLASSES)[classes]})
+    return geometries, json_records(properties)
+
+
+def clear_export(directory):
+    """Remove the layers and metadata.json of an earlier export from `directory`, leaving anything else.
+
+    Raises FileExistsError for a non-empty directory that holds no earlier
+    export, rather than writing tiles among unrelated files.
+    """
+    if not directory.exists() or not any(directory.iterdir()):
+        return
+    if not (directory / 'metadata.json').exists():
+        raise FileExistsError(f'{directory} is not empty and holds no earlier tile export')
+    for layer in ['neighborhoods', 'edges']:
+        shutil.rmtree(directory / layer, ignore_errors=True)
+    (directory / 'metadata.json').unlink()
+
+
+def export_tiles(gdf, network, simulated, zooms=ZOOMS, directory=TILE_DIR, columns=ANALYSIS_COLUMNS):
+    """Write neighborhood and road edge layers as z/x/y tiles of GeoJSON at several zoom levels.
+
+    Neighborhoods use the coarsest cached level of detail within half a
+    pixel at each zoom. `gdf` and the network must be in EPSG:4326. A
+    metadata.json next to the layers lists their URL templates, fields,
+    zoom range and bounds for a static web map viewer. The layers of an
+    earlier export in `directory` are replaced (see clear_export).
+    """
+    directory = Path(directory)
+    clear_export(directory)
+    levels = load_levels().set_index('slug').loc[gdf['slug']]
+    neighborhood_records = neighborhood_layer(gdf, columns)
+    counts = {'neighborhoods': 0, 'edges': 0}
+    for zoom in zooms:
+        polygons = np.asarray(levels[select_level(levels, pixel_degrees(zoom) / 2)].values)
+        counts['neighborhoods'] += write_tiles(directory / 'neighborhoods', polygons, neighborhood_records, zoom)
+        geometries, records = edge_layer(network, simulated, zoom)
+        counts['edges'] += write_tiles(directory / 'edges', geometries, records, zoom)
+
+    metadata = {
+        'format': 'geojson', 'minzoom': min(zooms), 'maxzoom': max(zooms),
+        'bounds': [float(value) for value in gdf.total_bounds],
+        'layers': {
+            'neighborhoods': {'url': 'neighborhoods/{z}/{x}/{y}.geojson',
+                              'fields': ['name'] + list(columns) + ['high_exposure', 'low_exposure'],
+                              'tiles': counts['neighborhoods']},
+            'edges': {'url': 'edges/{z}/{x}/{y}.geojson', 'fields': ['color_class', 'color', 'pm25_reduction'],
+                      'detail_zoom': EDGE_DETAIL_ZOOM, 'tiles': counts['edges']},
+        },
+    }
+    (directory / 'metadata.json').write_text(json.dumps(metadata, indent=2))
+    return metadata
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export the neighborhoods and simulated edges as z/x/y GeoJSON tiles.')
+    parser.add_argument('--zooms', type=int, nargs=2, default=[min(ZOOMS), max(ZOOMS)], metavar=('MIN', 'MAX'),
+                        help='zoom range to write')
+    parser.add_argument('--output', default=str(TILE_DIR), help='tile directory; an earlier export there is replaced')
+    args = parser.parse_args()
+
+    gdf = load_neighborhoods()
+    network = build_road_network(read_roadways(crs=gdf.crs))
+    covered, attributes = aggregate_weighted(load_overlay(network, gdf), gdf)
+    result = simulate_effects(*[attributes[column] for column in EDGE_ATTRIBUTES])
+    simulated = {'edge': covered, 'pm25_reduction': result['pm25_reduction'], 'color_class': result['color_class']}
+    metadata = export_tiles(gdf, network, simulated, range(args.zooms[0], args.zooms[1] + 1), args.output)
+    print(f"{metadata['layers']['neighborhoods']['tiles']} neighborhood and {metadata['layers']['edges']['tiles']} "
+          f"edge tiles written to {args.output}")
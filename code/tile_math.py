@@ -0,0 +1,22 @@
+import math
+
+
+def pixel_degrees(zoom):
+    # Width of one pixel of a 256 px web map tile, in degrees of longitude
+    return 360 / (256 * 2 ** zoom)
+
+
+def tile_xy(lon, lat, zoom):
+    # (x, y) of the web map tile holding a lon/lat point, clamped to the world at `zoom`
+    n = 2 ** zoom
+    x = math.floor((lon + 180) / 360 * n)
+    y = math.floor((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_bounds(x, y, zoom):
+    """(west, south, east, north) of a web map tile, in degrees."""
+    n = 2 ** zoom
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return x / n * 360 - 180, south, (x + 1) / n * 360 - 180, north
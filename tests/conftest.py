@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The scripts in code/ import their sibling modules directly, as when run with `python code/<script>.py`
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'code'))
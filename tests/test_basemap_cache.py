@@ -0,0 +1,110 @@
+import io
+import os
+import threading
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import basemap_cache
+from basemap_cache import enforce_limit, offline_mode, prefetch, read_tile, stitch_tiles, tile_path, tile_server
+
+# Small box in Los Angeles, one tile wide at zooms 0-2
+BOUNDS = (-118.3, 34.0, -118.2, 34.1)
+ZOOMS = range(0, 3)
+TILE_SIZE = 8
+
+
+def tile_png(zoom, x, y):
+    # Solid tile whose color encodes its position, so stitched images can be checked
+    image = Image.new('RGB', (TILE_SIZE, TILE_SIZE), (zoom * 40, x * 40, y * 40))
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def server(tmp_path):
+    """Stand-in tile server with every tile of zooms 0-2, yielding its URL template."""
+    root = tmp_path / 'server'
+    for zoom in ZOOMS:
+        for x in range(2 ** zoom):
+            for y in range(2 ** zoom):
+                path = root / str(zoom) / str(x) / f'{y}.png'
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_bytes(tile_png(zoom, x, y))
+    http = tile_server(root, port=0)
+    thread = threading.Thread(target=http.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{http.server_port}/{{z}}/{{x}}/{{y}}.png'
+    http.shutdown()
+    http.server_close()
+
+
+def test_prefetch_fetches_missing_tiles_once(server, tmp_path):
+    directory = tmp_path / 'cache'
+    counts = prefetch(BOUNDS, ZOOMS, server, directory, workers=1)
+    assert counts == {'cached': 0, 'fetched': 3, 'failed': 0, 'evicted': 0}
+    cache = basemap_cache.cache_dir(server, directory)
+    assert tile_path(cache, 2, 0, 1).read_bytes() == tile_png(2, 0, 1)
+
+    counts = prefetch(BOUNDS, ZOOMS, server, directory, workers=1)
+    assert counts == {'cached': 3, 'fetched': 0, 'failed': 0, 'evicted': 0}
+
+
+def test_prefetch_counts_tiles_the_server_lacks(server, tmp_path):
+    counts = prefetch(BOUNDS, range(2, 4), server, tmp_path / 'cache', workers=1)
+    assert counts['fetched'] == 1
+    assert counts['failed'] == 1
+
+
+def test_offline_reads_only_the_cache(server, tmp_path):
+    directory = tmp_path / 'cache'
+    cache = basemap_cache.cache_dir(server, directory)
+    with pytest.raises(FileNotFoundError):
+        read_tile(cache, 2, 0, 1, server, offline=True)
+
+    prefetch(BOUNDS, ZOOMS, server, directory, workers=1)
+    image, extent = stitch_tiles(BOUNDS, 2, server, directory, offline=True)
+    assert image.shape == (TILE_SIZE, TILE_SIZE, 4)
+    assert tuple(image[0, 0, :3]) == (80, 0, 40)
+    assert np.allclose(extent, basemap_cache.mercator_extent(2, 0, 1, 0, 1))
+
+
+def test_missing_tile_is_fetched_into_the_cache_when_online(server, tmp_path):
+    cache = basemap_cache.cache_dir(server, tmp_path / 'cache')
+    assert read_tile(cache, 1, 0, 0, server) == tile_png(1, 0, 0)
+    assert tile_path(cache, 1, 0, 0).exists()
+
+
+def test_unreachable_server_raises_file_not_found(tmp_path):
+    cache = basemap_cache.cache_dir('http://127.0.0.1:9/{z}/{x}/{y}.png', tmp_path / 'cache')
+    with pytest.raises(FileNotFoundError):
+        read_tile(cache, 0, 0, 0, 'http://127.0.0.1:9/{z}/{x}/{y}.png')
+
+
+@pytest.mark.parametrize('value, expected', [('1', True), ('true', True), ('YES', True),
+                                             ('0', False), ('false', False), ('', False)])
+def test_offline_mode_parses_the_environment(monkeypatch, value, expected):
+    monkeypatch.setenv('BASEMAP_OFFLINE', value)
+    assert offline_mode() is expected
+
+
+def test_enforce_limit_evicts_least_recently_used(server, tmp_path):
+    directory = tmp_path / 'cache'
+    prefetch(BOUNDS, ZOOMS, server, directory, workers=1)
+    cache = basemap_cache.cache_dir(server, directory)
+    tiles = [(zoom, *basemap_cache.tile_range(BOUNDS, zoom)[0][1:]) for zoom in ZOOMS]
+    for age, tile in enumerate(tiles):
+        os.utime(tile_path(cache, *tile), (1000 + age, 1000 + age))
+    # Reading the oldest tile makes it the most recently used
+    read_tile(cache, *tiles[0], server)
+
+    sizes = [tile_path(cache, *tile).stat().st_size for tile in tiles]
+    assert enforce_limit(cache, (sum(sizes) - 1) / 2 ** 20) == 1
+    assert tile_path(cache, *tiles[0]).exists()
+    assert not tile_path(cache, *tiles[1]).exists()
+    assert tile_path(cache, *tiles[2]).exists()
+
+    assert enforce_limit(cache, 0) == 2
+    assert not list(cache.glob('*/*/*.png'))